@@ -0,0 +1,132 @@
+"""
+Benchmark the sampling profiles in cfg/sampling on the bundled shapes.
+
+Every shape is rendered with a reference number of samples and with every profile, the report
+has the render time, the SSIM against the reference and the noise level of every profile.
+
+Usage:
+    blender -b -P benchmark_sampling.py -- [--profiles draft fast balanced] [--min-ssim 0.98]
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import yaml
+
+working_dir_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(working_dir_path)
+
+from hesiod import get_cfg_copy, hmain
+
+from utils.batch import BatchRenderer
+from utils.manifest import scan_jobs
+from utils.metrics import noise_level, ssim
+from utils.utils import read_image
+
+
+def parse_args() -> argparse.Namespace:
+    # Blender passes its own arguments before "--"
+    argv = sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else sys.argv[1:]
+    dir_cfg = Path(working_dir_path) / "cfg"
+    profiles = sorted(path.stem for path in (dir_cfg / "sampling").glob("*.yaml"))
+
+    parser = argparse.ArgumentParser(description="Benchmark the sampling profiles.")
+    parser.add_argument("--profiles", nargs="+", default=profiles, choices=profiles)
+    parser.add_argument("--shapes", type=Path, default=Path(working_dir_path) / "shapes")
+    parser.add_argument("--out", type=Path, default=Path("benchmark_sampling"))
+    parser.add_argument("--reference-samples", type=int, default=2048)
+    parser.add_argument("--min-ssim", type=float, default=0.98, help="the quality bar")
+    parser.add_argument("--cfg", type=Path, default=dir_cfg / "render.yaml")
+    parser.add_argument("--cfg-dir", type=Path, default=dir_cfg)
+
+    return parser.parse_args(argv)
+
+
+def render_profile(
+    cfg: Dict[str, Any], sampling: Dict[str, Any], jobs: List[Dict[str, Any]], dir_out: Path
+) -> Dict[str, Dict[str, Any]]:
+    """Render the shapes of the benchmark with one sampling profile.
+
+    Args:
+        cfg: the configuration.
+        sampling: the sampling profile.
+        jobs: the jobs of the shapes.
+        dir_out: the directory of the renders.
+
+    Returns:
+        The results of the jobs by shape.
+    """
+    results = {}
+    with BatchRenderer({**cfg, "sampling": sampling}) as renderer:
+        for job in jobs:
+            path_render = dir_out / f"{Path(job['input']).stem}.png"
+            results[Path(job["input"]).stem] = renderer.render({**job, "output": str(path_render)})
+
+    return results
+
+
+def main() -> None:
+
+    args = parse_args()
+    jobs = scan_jobs(args.shapes, "*")
+
+    @hmain(base_cfg_dir=args.cfg_dir, run_cfg_file=args.cfg, create_out_dir=False)
+    def run() -> None:
+        # The images are read right after every render, they must not be written in the background.
+        cfg = {**get_cfg_copy(), "reuse_scene": False, "save_blender": False, "writer": None}
+        cfg["path_timings"] = str(args.out / "timings.jsonl")
+
+        with open(args.cfg_dir / "sampling/fixed.yaml") as f:
+            reference = {**yaml.safe_load(f), "max_samples": args.reference_samples}
+        render_profile(cfg, reference, jobs, args.out / "reference")
+
+        report = {}
+        for profile in args.profiles:
+            with open(args.cfg_dir / f"sampling/{profile}.yaml") as f:
+                sampling = yaml.safe_load(f)
+            results = render_profile(cfg, sampling, jobs, args.out / profile)
+
+            rows = {}
+            for shape, result in results.items():
+                image = read_image(result["output"])
+                image_reference = read_image(args.out / "reference" / f"{shape}.png")
+                rows[shape] = {
+                    "render_time": result["render_time"],
+                    "ssim": ssim(image, image_reference),
+                    "noise": noise_level(image),
+                }
+
+            report[profile] = {
+                "sampling": sampling,
+                "shapes": rows,
+                "render_time": float(np.sum([row["render_time"] for row in rows.values()])),
+                "ssim": float(np.min([row["ssim"] for row in rows.values()])),
+                "noise": float(np.max([row["noise"] for row in rows.values()])),
+            }
+
+        print(f"{'profile':<10} {'time [s]':>10} {'min ssim':>10} {'max noise':>10}")
+        for profile, row in sorted(report.items(), key=lambda item: item[1]["render_time"]):
+            print(
+                f"{profile:<10} {row['render_time']:>10.2f} {row['ssim']:>10.4f}"
+                f" {row['noise']:>10.4f}"
+            )
+
+        passing = [profile for profile, row in report.items() if row["ssim"] >= args.min_ssim]
+        if passing:
+            cheapest = min(passing, key=lambda profile: report[profile]["render_time"])
+            print(f"Cheapest profile with SSIM >= {args.min_ssim}: {cheapest}")
+        else:
+            print(f"No profile reaches SSIM {args.min_ssim}")
+
+        with open(args.out / "benchmark.json", "w") as f:
+            json.dump(report, f, indent=2)
+
+    run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Time the stages of the pipeline on the bundled shapes and on synthetic shapes of growing size.
+
+The results are saved to JSON with the metadata of the machine, comparing them with a baseline
+flags the cases slower than the tolerance or missing and exits with code 1.
+
+Usage:
+    blender -b -P benchmark_suite.py -- --out benchmark.json
+    blender -b -P benchmark_suite.py -- --out new.json --baseline benchmark.json --tolerance 0.1
+    python benchmark_suite.py --compare new.json --baseline benchmark.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+import yaml
+
+working_dir_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(working_dir_path)
+
+from utils.benchmark import compare_results, machine_metadata, print_comparison, time_case
+from utils.writer import encode_image
+
+DIR_SHAPES = Path(working_dir_path) / "shapes"
+DIR_CFG = Path(working_dir_path) / "cfg"
+# Name, suffix and options of encode_image of the encoding cases.
+ENCODINGS = [
+    ("png_1", ".png", {"compression": 1}),
+    ("png_6", ".png", {"compression": 6}),
+    ("png_9", ".png", {"compression": 9}),
+    ("png16_6", ".png", {"compression": 6, "color_depth": "16"}),
+    ("webp_90", ".webp", {"quality": 90}),
+    ("webp_lossless", ".webp", {"quality": 100}),
+    ("exr_half_zip", ".exr", {"color_depth": "16", "exr_codec": "ZIP"}),
+    ("exr_float_none", ".exr", {"color_depth": "32", "exr_codec": "NONE"}),
+]
+
+
+def parse_args() -> argparse.Namespace:
+    # Blender passes its own arguments before "--"
+    argv = sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description="Benchmark the rendering pipeline.")
+    parser.add_argument("--out", type=Path, default=Path("benchmark.json"))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--grids", type=int, nargs="*", default=[32, 64, 128])
+    parser.add_argument(
+        "--max-mesh-points", type=int, default=100_000, help="the largest cloud in mesh mode"
+    )
+    parser.add_argument("--cases", nargs="*", help="run only the cases containing these words")
+    parser.add_argument("--baseline", type=Path, help="the results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="the allowed slowdown")
+    parser.add_argument("--compare", type=Path, help="compare these results, without running")
+
+    return parser.parse_args(argv)
+
+
+def synthetic_pcd(num_points: int, seed: int = 0) -> np.ndarray:
+    """Sample points on a noisy sphere of radius 0.4, with random colors."""
+    rng = np.random.default_rng(seed)
+    directions = rng.normal(size=(num_points, 3))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    points = directions * (0.4 + 0.01 * rng.normal(size=(num_points, 1)))
+
+    return np.concatenate((points, rng.random((num_points, 3))), axis=1)
+
+
+def synthetic_voxels(resolution: int) -> np.ndarray:
+    """Fill a ball of diameter 0.9 in a grid spanning [-0.5, 0.5]."""
+    centers = (np.arange(resolution) + 0.5) / resolution - 0.5
+    x, y, z = np.meshgrid(centers, centers, centers, indexing="ij")
+
+    return (x**2 + y**2 + z**2 <= 0.45**2).astype(np.uint8)
+
+
+def synthetic_render(resolution: int) -> np.ndarray:
+    """Shade a sphere of radius 0.4 lit from the top left, on a transparent background."""
+    coords = (np.arange(resolution) + 0.5) / resolution - 0.5
+    x, y = np.meshgrid(coords, -coords)
+    z2 = 0.4**2 - x**2 - y**2
+    alpha = (z2 > 0).astype(np.float32)
+    normal = np.stack((x, y, np.sqrt(np.maximum(z2, 0.0))), axis=-1) / 0.4
+    shading = np.clip(normal @ np.array([-0.5, 0.5, 0.7]), 0.0, 1.0) * alpha
+
+    return np.stack((0.6 * shading, 0.79 * shading, shading, alpha), axis=-1).astype(np.float32)
+
+
+def shape_params(shape_type: str) -> Dict[str, Any]:
+    """Get the default parameters of a shape type from cfg, rendering few samples on CPU."""
+    with open(DIR_CFG / "render.yaml") as f:
+        params = {k: v for k, v in yaml.safe_load(f).items() if not isinstance(v, dict)}
+    with open(DIR_CFG / "shapes" / f"{shape_type}.yaml") as f:
+        params.update(yaml.safe_load(f))
+
+    params.update(
+        {
+            "type": shape_type,
+            "device": "CPU",
+            "res_x": 200,
+            "res_y": 200,
+            "num_samples": 16,
+            "sampling": None,
+            "views": None,
+            "passes": None,
+            "border": None,
+        }
+    )
+
+    return params
+
+
+def get_cases(args: argparse.Namespace) -> Dict[str, Tuple[Callable, Callable]]:
+    """Get the benchmark cases, importing bpy only here to compare results without Blender.
+
+    Returns:
+        The setup, not timed, and the function to time of every case by name.
+    """
+    import bpy  # type: ignore
+
+    from utils.batch import build_object, create_shape_material, load_shape, setup_scene
+    from utils.ply import read_ply
+    from utils.utils import load_mesh, pcd_to_sphere, voxels_to_cube
+
+    def reset() -> None:
+        bpy.ops.wm.read_factory_settings(use_empty=True)
+
+    pcd_chair = read_ply(DIR_SHAPES / "chair_pcd.ply")["vertices"]
+    voxels_chair = np.load(DIR_SHAPES / "chair_voxel.npz")["voxel"]
+
+    clouds = {"chair": pcd_chair}
+    clouds.update({f"synthetic_{size}": synthetic_pcd(size) for size in args.sizes})
+    grids = {"chair": voxels_chair}
+    grids.update({f"synthetic_{res}": synthetic_voxels(res) for res in args.grids})
+
+    cases = {}
+    for name, pcd in clouds.items():
+        for mode in ("mesh", "instance", "points"):
+            if mode == "mesh" and pcd.shape[0] > args.max_mesh_points:
+                continue
+            cases[f"pcd_to_sphere/{name}/{mode}"] = (
+                reset,
+                lambda pcd=pcd, mode=mode: pcd_to_sphere(
+                    pcd, radius=0.01, subdivision=1, mode=mode
+                ),
+            )
+
+    for name, voxels in grids.items():
+        # Cubes filling their cells, as needed by the surface modes.
+        radius = 0.5 / voxels.shape[0]
+        for mode in ("cubes", "surface", "greedy"):
+            cases[f"voxels_to_cube/{name}/{mode}"] = (
+                reset,
+                lambda voxels=voxels, radius=radius, mode=mode: voxels_to_cube(
+                    voxels, radius=radius, mode=mode
+                ),
+            )
+
+    cases["load_mesh/chair"] = (reset, lambda: load_mesh(DIR_SHAPES / "chair_mesh.ply"))
+
+    dir_tmp = Path(tempfile.mkdtemp())
+    params = shape_params("pcd")
+    objects = {}
+
+    def build_chair() -> None:
+        reset()
+        objects["chair"] = pcd_to_sphere(pcd_chair, radius=0.01, subdivision=1)
+
+    def setup_chair() -> None:
+        create_shape_material(params, objects["chair"])
+        setup_scene(params, objects["chair"], dir_tmp / "chair.png")
+
+    cases["scene_setup/chair"] = (build_chair, setup_chair)
+
+    # One render for every bundled input, built as in a batch.
+    for path_input in sorted(DIR_SHAPES.glob("chair_*")):
+        shape_type = path_input.stem.split("_")[-1]
+        params_render = {**shape_params(shape_type), "input": str(path_input)}
+        data = load_shape(params_render)
+
+        def build_and_setup(params_render=params_render, data=data) -> None:
+            reset()
+            obj = build_object(params_render, data)
+            create_shape_material(params_render, obj)
+            setup_scene(params_render, obj, dir_tmp / f"{Path(params_render['input']).stem}.png")
+
+        cases[f"render/{path_input.stem}_cpu_16_samples"] = (
+            build_and_setup,
+            lambda: bpy.ops.render.render(write_still=True),
+        )
+
+    image = synthetic_render(800)
+    for name, suffix, options in ENCODINGS:
+        if suffix == ".webp" and importlib.util.find_spec("PIL") is None:
+            continue
+        cases[f"encode/{name}"] = (
+            None,
+            lambda suffix=suffix, options=options: encode_image(image, suffix, **options),
+        )
+
+    if args.cases:
+        cases = {k: v for k, v in cases.items() if any(word in k for word in args.cases)}
+
+    return cases
+
+
+def main() -> None:
+
+    args = parse_args()
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            results = json.load(f)["results"]
+    else:
+        import bpy  # type: ignore
+
+        results = {}
+        for name, (setup, run) in get_cases(args).items():
+            results[name] = time_case(run, repeats=args.repeats, setup=setup)
+            print(f"{name:<40} {results[name]['median']:.4f}s")
+
+        metadata = machine_metadata(blender=bpy.app.version_string, repeats=args.repeats)
+        with open(args.out, "w") as f:
+            json.dump({"metadata": metadata, "results": results}, f, indent=2)
+        print(f"Results saved to {args.out}")
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        rows = compare_results(results, baseline, tolerance=args.tolerance)
+        print_comparison(rows)
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Render the jobs of a manifest with many Blender processes sharing the CPU cores.
+
+Usage:
+    python launch_batch.py jobs.jsonl --workers 8 [--out batch_logs] [--cfg cfg/render.yaml]
+"""
+import argparse
+from pathlib import Path
+
+from utils.launcher import launch_workers
+from utils.manifest import load_manifest
+
+
+def main() -> None:
+
+    working_dir = Path(__file__).resolve().parent
+
+    parser = argparse.ArgumentParser(description="Render a manifest with many workers.")
+    parser.add_argument("manifest", type=Path, help="the .csv, .jsonl or .yaml manifest")
+    parser.add_argument("--workers", type=int, default=4, help="the number of Blender processes")
+    parser.add_argument("--cpus", type=int, help="the cores to share, all the available ones")
+    parser.add_argument("--out", type=Path, default=Path("batch_logs"), help="shards and logs")
+    parser.add_argument("--cfg", type=Path, default=working_dir / "cfg/render.yaml")
+    parser.add_argument("--cfg-dir", type=Path, default=working_dir / "cfg")
+    parser.add_argument("--blender", default="blender", help="the Blender executable")
+    parser.add_argument("--bpy", action="store_true", help="run with python and the bpy module")
+    args = parser.parse_args()
+
+    summary = launch_workers(
+        load_manifest(args.manifest),
+        args.workers,
+        args.out,
+        args.cfg.resolve(),
+        args.cfg_dir.resolve(),
+        blender=None if args.bpy else args.blender,
+        num_cpus=args.cpus,
+    )
+
+    print(
+        f"Rendered {summary['num_done']}/{summary['num_jobs']} jobs in {summary['wall_time']:.1f}s"
+        f" ({summary['jobs_per_second']:.2f} jobs/s), {summary['num_failed']} failed,"
+        f" {summary['num_too_large']} above max_memory_mb,"
+        f" summary in {args.out / 'summary.json'}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import List, Optional, Tuple
 
+import numpy as np
 from PIL import Image
 
 
@@ -33,17 +37,228 @@ def load_and_crop(
     return image_cropped
 
 
+def alpha_bbox(image: Image.Image, threshold: int = 0) -> Optional[Tuple[int, int, int, int]]:
+    """Find the tight bounding box of the visible pixels of an image with transparent background.
+
+    Args:
+        image: the RGBA image.
+        threshold: the pixels with alpha above threshold are visible. Defaults to 0.
+
+    Returns:
+        The box (left, top, right, bottom) as in Image.crop, None if no pixel is visible.
+    """
+    alpha = np.asarray(image.getchannel("A"))
+    rows = np.flatnonzero(alpha.max(axis=1) > threshold)
+    cols = np.flatnonzero(alpha.max(axis=0) > threshold)
+    if rows.size == 0:
+        return None
+
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def pad_box(
+    box: Tuple[int, int, int, int], padding: int, size: Tuple[int, int]
+) -> Tuple[int, int, int, int]:
+    """Grow a box by padding pixels on every side, within an image of the given size."""
+    left, top, right, bottom = box
+    width, height = size
+
+    return (
+        max(0, left - padding),
+        max(0, top - padding),
+        min(width, right + padding),
+        min(height, bottom + padding),
+    )
+
+
+def union_box(boxes: List[Tuple[int, int, int, int]]) -> Tuple[int, int, int, int]:
+    """Get the smallest box containing all the boxes."""
+    lefts, tops, rights, bottoms = zip(*boxes)
+
+    return min(lefts), min(tops), max(rights), max(bottoms)
+
+
+def autocrop(
+    path_image: Path,
+    path_out: Path,
+    padding: int = 10,
+    box: Optional[Tuple[int, int, int, int]] = None,
+) -> Path:
+    """Crop an image to its visible pixels plus padding.
+
+    Args:
+        path_image: the path to the RGBA image.
+        path_out: the path to the cropped image.
+        padding: the pixels kept around the visible ones. Defaults to 10.
+        box: the optional box to crop, before padding, instead of the one of the image.
+            Defaults to None.
+
+    Returns:
+        The path to the cropped image.
+    """
+    image = Image.open(path_image).convert("RGBA")
+    box = box or alpha_bbox(image)
+    if box is not None:
+        image = image.crop(pad_box(box, padding, image.size))
+
+    path_out.parent.mkdir(exist_ok=True, parents=True)
+    image.save(path_out)
+
+    return path_out
+
+
+def _alpha_bbox_file(path_image: Path) -> Optional[Tuple[int, int, int, int]]:
+    return alpha_bbox(Image.open(path_image).convert("RGBA"))
+
+
+def crop_directory(
+    dir_input: Path,
+    dir_output: Path,
+    pattern: str = "*.png",
+    padding: int = 10,
+    shared_box: bool = False,
+    num_workers: Optional[int] = None,
+) -> List[Path]:
+    """Crop all the images in a directory tree with a process pool, mirroring the tree.
+
+    Args:
+        dir_input: the directory scanned recursively.
+        dir_output: the directory of the cropped images.
+        pattern: the pattern of the images. Defaults to "*.png".
+        padding: the pixels kept around the visible ones. Defaults to 10.
+        shared_box: if True all the images of a folder are cropped with the same box, e.g. to
+            keep aligned the steps of an interpolation. Defaults to False.
+        num_workers: the number of processes, if None the number of cores. Defaults to None.
+
+    Returns:
+        The paths to the cropped images.
+    """
+    paths = sorted(Path(dir_input).rglob(pattern))
+    paths_out = [dir_output / path.relative_to(dir_input) for path in paths]
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        boxes = [None] * len(paths)
+        if shared_box:
+            boxes_folder = {}
+            for path, box in zip(paths, executor.map(_alpha_bbox_file, paths, chunksize=16)):
+                if box is not None:
+                    boxes_folder.setdefault(path.parent, []).append(box)
+            boxes_folder = {folder: union_box(boxes) for folder, boxes in boxes_folder.items()}
+            boxes = [boxes_folder.get(path.parent) for path in paths]
+
+        paddings = [padding] * len(paths)
+        return list(executor.map(autocrop, paths, paths_out, paddings, boxes, chunksize=16))
+
+
+def contact_sheet(
+    paths: List[Path],
+    num_columns: int,
+    spacing: int = 10,
+    background: Tuple[int, int, int, int] = (255, 255, 255, 0),
+) -> Image.Image:
+    """Assemble images in a grid, each centered in a cell as large as the largest image.
+
+    Args:
+        paths: the paths to the images, in row-major order.
+        num_columns: the number of columns of the grid.
+        spacing: the pixels between two cells. Defaults to 10.
+        background: the RGBA color of the background. Defaults to transparent white.
+
+    Returns:
+        The grid.
+    """
+    images = [Image.open(path).convert("RGBA") for path in paths]
+    cell_w = max(image.width for image in images)
+    cell_h = max(image.height for image in images)
+    num_columns = min(num_columns, len(images))
+    num_rows = -(-len(images) // num_columns)
+
+    width = num_columns * cell_w + (num_columns - 1) * spacing
+    height = num_rows * cell_h + (num_rows - 1) * spacing
+    sheet = Image.new("RGBA", (width, height), background)
+    for i, image in enumerate(images):
+        row, col = divmod(i, num_columns)
+        x = col * (cell_w + spacing) + (cell_w - image.width) // 2
+        y = row * (cell_h + spacing) + (cell_h - image.height) // 2
+        sheet.alpha_composite(image, (x, y))
+
+    return sheet
+
+
+def _save_contact_sheet(paths: List[Path], path_out: Path, num_columns: int) -> Path:
+    path_out.parent.mkdir(exist_ok=True, parents=True)
+    contact_sheet(paths, num_columns).save(path_out)
+
+    return path_out
+
+
+def contact_sheets(
+    dir_input: Path,
+    dir_output: Path,
+    pattern: str = "*.png",
+    num_columns: int = 8,
+    num_workers: Optional[int] = None,
+) -> List[Path]:
+    """Assemble one contact sheet for every folder with images, e.g. every interpolation.
+
+    Args:
+        dir_input: the directory scanned recursively.
+        dir_output: the directory of the sheets, one <folder>.png for every folder.
+        pattern: the pattern of the images, sorted by name in the sheets. Defaults to "*.png".
+        num_columns: the number of columns of the sheets. Defaults to 8.
+        num_workers: the number of processes, if None the number of cores. Defaults to None.
+
+    Returns:
+        The paths to the sheets.
+    """
+    folders = {}
+    for path in sorted(Path(dir_input).rglob(pattern)):
+        folders.setdefault(path.parent, []).append(path)
+
+    paths_out = []
+    for folder in folders:
+        name = "_".join(folder.relative_to(dir_input).parts) or Path(dir_input).name
+        paths_out.append(dir_output / f"{name}.png")
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        columns = [num_columns] * len(folders)
+        return list(executor.map(_save_contact_sheet, folders.values(), paths_out, columns))
+
+
 def main():
 
-    path_image = Path("/home/rspezialetti/mlpio/rec_voxels_renders/00/17647_gt.png")
-    dir_cropped = Path("/home/rspezialetti/mlpio/reconstruction_voxels_renders_cropped/")
-    dir_cropped.mkdir(exist_ok=True)
+    parser = argparse.ArgumentParser(description="Crop renders and assemble contact sheets.")
+    parser.add_argument("dir_input", type=Path, help="the directory with the renders")
+    parser.add_argument("dir_output", type=Path, help="the directory of the results")
+    parser.add_argument("--pattern", default="*.png", help="the pattern of the renders")
+    parser.add_argument("--padding", type=int, default=10, help="the pixels around the object")
+    parser.add_argument("--shared-box", action="store_true", help="one box for every folder")
+    parser.add_argument("--sheets", action="store_true", help="also one sheet for every folder")
+    parser.add_argument("--columns", type=int, default=8, help="the columns of the sheets")
+    parser.add_argument("--workers", type=int, help="the processes, the number of cores")
+    args = parser.parse_args()
 
-    image_cropped = load_and_crop(
-        str(path_image), margin_left=140, margin_right=180, margin_bottom=140, margin_top=130
+    dir_cropped = args.dir_output / "cropped"
+    paths = crop_directory(
+        args.dir_input,
+        dir_cropped,
+        pattern=args.pattern,
+        padding=args.padding,
+        shared_box=args.shared_box,
+        num_workers=args.workers,
     )
-    image_cropped.show()
-    image_cropped.save(dir_cropped / f"{path_image.stem}.png")
+    print(f"Cropped {len(paths)} images to {dir_cropped}")
+
+    if args.sheets:
+        dir_sheets = args.dir_output / "sheets"
+        paths = contact_sheets(
+            dir_cropped,
+            dir_sheets,
+            pattern=args.pattern,
+            num_columns=args.columns,
+            num_workers=args.workers,
+        )
+        print(f"Saved {len(paths)} contact sheets to {dir_sheets}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,29 @@
+"""
+Create a JSONL manifest for render_batch.py from the shapes in a directory tree.
+
+Usage:
+    python make_manifest.py /path/to/shapes "*.ply" jobs.jsonl [--type pcd] [--out /path/to/renders]
+"""
+import argparse
+from pathlib import Path
+
+from utils.manifest import SHAPE_TYPES, save_manifest, scan_jobs
+
+
+def main() -> None:
+
+    parser = argparse.ArgumentParser(description="Create a manifest from a directory of shapes.")
+    parser.add_argument("dir_input", type=Path, help="the directory scanned recursively")
+    parser.add_argument("pattern", help='the pattern of the shapes, e.g. "*.ply"')
+    parser.add_argument("manifest", type=Path, help="the .jsonl manifest to write")
+    parser.add_argument("--type", choices=SHAPE_TYPES, help="the type, guessed from the suffix")
+    parser.add_argument("--out", type=Path, help="the directory of the renders")
+    args = parser.parse_args()
+
+    jobs = scan_jobs(args.dir_input, args.pattern, shape_type=args.type, dir_output=args.out)
+    save_manifest(jobs, args.manifest)
+    print(f"Saved {len(jobs)} jobs to {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Render every job of a manifest with a single Blender session.
+
+Every attempt is recorded in a journal, running again the same command resumes the batch. The
+durations of the stages of every shape are appended to a JSONL log.
+
+Usage:
+    blender -b -P render_batch.py -- jobs.jsonl [--cfg cfg/render.yaml]
+    python render_batch.py jobs.jsonl [--cfg cfg/render.yaml]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+working_dir_path = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(working_dir_path)
+
+from hesiod import get_cfg_copy, hmain
+
+from utils.batch import BatchRenderer
+from utils.journal import Journal
+from utils.manifest import load_manifest, save_manifest
+
+
+def parse_args() -> argparse.Namespace:
+    # Blender passes its own arguments before "--"
+    argv = sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description="Render the jobs of a manifest.")
+    parser.add_argument("manifest", type=Path, help="the .csv, .jsonl or .yaml manifest")
+    parser.add_argument("--cfg", type=Path, default=Path(working_dir_path) / "cfg/render.yaml")
+    parser.add_argument("--cfg-dir", type=Path, default=Path(working_dir_path) / "cfg")
+    parser.add_argument("--threads", type=int, help="the CPU threads, overrides num_threads")
+    parser.add_argument("--journal", type=Path, help="the journal, <manifest>_journal.jsonl")
+    parser.add_argument("--timings", type=Path, help="the stage log, <manifest>_timings.jsonl")
+
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+
+    args = parse_args()
+    jobs = load_manifest(args.manifest)
+    path_journal = args.journal or args.manifest.with_name(f"{args.manifest.stem}_journal.jsonl")
+    path_timings = args.timings or args.manifest.with_name(f"{args.manifest.stem}_timings.jsonl")
+
+    @hmain(base_cfg_dir=args.cfg_dir, run_cfg_file=args.cfg, create_out_dir=False)
+    def run() -> None:
+        cfg = get_cfg_copy()
+        if args.threads is not None:
+            cfg["num_threads"] = args.threads
+        if args.timings is not None or cfg.get("path_timings") is None:
+            cfg["path_timings"] = str(path_timings)
+
+        time_start = time.time()
+        journal = Journal(path_journal)
+        max_attempts = cfg.get("max_attempts", 1)
+        with BatchRenderer(cfg) as renderer:
+            results = renderer.render_all(jobs, journal=journal, max_attempts=max_attempts)
+        failures = [job for job, result in zip(jobs, results) if result["status"] == "failed"]
+        num_too_large = sum(result["status"] == "too_large" for result in results)
+
+        num_done = len(jobs) - len(failures) - num_too_large
+        print(f"Rendered {num_done}/{len(jobs)} jobs in {time.time() - time_start}")
+        if num_too_large:
+            print(f"Skipped {num_too_large} jobs above max_memory_mb, see {path_journal}")
+        if failures:
+            path_failures = args.manifest.with_name(f"{args.manifest.stem}_failed.jsonl")
+            save_manifest(failures, path_failures)
+            print(f"Failed jobs saved to {path_failures}")
+
+    run()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,14 @@ from pathlib import Path
 
 import bpy
 
+from utils.cache import GeometryCache
+from utils.profiling import ShapeProfile, stage
 from utils.utils import (
     add_track_to_constraint,
     create_camera,
     create_light,
     create_plane,
+    geometry_counts,
     load_mesh,
     remove_objects,
     set_camera_params,
@@ -34,50 +37,70 @@ def main():
     save_blender = False
     add_plane = True
     use_denoiser = True
+    # Directory of the geometry cache, None disables it
+    path_cache = None
+    cache = GeometryCache(path_cache) if path_cache is not None else None
     lens = 85
 
-    # Reset
-    remove_objects()
-
-    # Rotation Object
-    rot_object = (math.radians(0), math.radians(0), math.radians(54))
-
-    # Object
-    focus_target_object = load_mesh(path_input)
-
-    # Location Plane
-    if add_plane:
-        z_plane = (focus_target_object.dimensions[-1] * 0.5) + 0.1
-        loc_plane = (0.0, 0.0, -z_plane)
-        create_plane(size=1.0, location=loc_plane)
-
-    # Camera
-    camera_object = create_camera(location=location_camera)
-    add_track_to_constraint(camera_object, focus_target_object)
-    set_camera_params(camera_object.data, focus_target_object, lens=lens)
-    scene = bpy.data.scenes["Scene"]
-    scene.camera = camera_object
-
-    # Light
-    light = create_light(location=loc_light, rotation=rot_light, name="sun", energy=energy)
-    bpy.context.collection.objects.link(light)
-
-    # Render Setting
-    path_render = path_out / f"{path_input.stem}.png"
-    set_render_params(
-        scene, path_render, resolution_x=res_x, resolution_y=res_y, use_transparent_bg=True
-    )
-    set_engine_params(
-        scene, ids_cuda_devices=devices, num_samples=num_samples, use_denoiser=use_denoiser
-    )
-
-    obj = bpy.data.objects["object"]
-    obj.rotation_euler = rot_object
-
-    bpy.ops.render.render(write_still=True)
-
-    if save_blender:
-        bpy.ops.wm.save_mainfile()
+    # JSONL log of the durations of the stages, None disables it
+    path_timings = path_out / "timings.jsonl"
+    # If True dump the cProfile stats of the render, readable with pstats
+    use_cprofile = False
+    path_pstats = path_out / f"{path_input.stem}.prof" if use_cprofile else None
+
+    with ShapeProfile(
+        path_input.stem, path_log=path_timings, path_pstats=path_pstats, input=str(path_input)
+    ) as profile:
+        # Reset
+        with stage("reset"):
+            remove_objects()
+
+        # Rotation Object
+        rot_object = (math.radians(0), math.radians(0), math.radians(54))
+
+        # Object
+        with stage("build"):
+            focus_target_object = load_mesh(path_input, cache=cache)
+
+        with stage("setup"):
+            # Location Plane
+            if add_plane:
+                z_plane = (focus_target_object.dimensions[-1] * 0.5) + 0.1
+                loc_plane = (0.0, 0.0, -z_plane)
+                create_plane(size=1.0, location=loc_plane)
+
+            # Camera
+            camera_object = create_camera(location=location_camera)
+            add_track_to_constraint(camera_object, focus_target_object)
+            set_camera_params(camera_object.data, focus_target_object, lens=lens)
+            scene = bpy.data.scenes["Scene"]
+            scene.camera = camera_object
+
+            # Light
+            light = create_light(location=loc_light, rotation=rot_light, name="sun", energy=energy)
+            bpy.context.collection.objects.link(light)
+
+            # Render Setting
+            path_render = path_out / f"{path_input.stem}.png"
+            set_render_params(
+                scene, path_render, resolution_x=res_x, resolution_y=res_y, use_transparent_bg=True
+            )
+            set_engine_params(
+                scene, ids_cuda_devices=devices, num_samples=num_samples, use_denoiser=use_denoiser
+            )
+
+            obj = bpy.data.objects["object"]
+            obj.rotation_euler = rot_object
+
+        profile.update(**geometry_counts(obj), samples=scene.cycles.samples)
+        with stage("render"):
+            bpy.ops.render.render()
+        with stage("write"):
+            bpy.data.images["Render Result"].save_render(str(path_render))
+
+        if save_blender:
+            with stage("save_blender"):
+                bpy.ops.wm.save_mainfile()
 
 
 if __name__ == "__main__":
@@ -4,20 +4,27 @@ from typing import List
 
 import bpy
 import numpy as np
-import open3d as o3d
 
+from utils.cache import GeometryCache
+from utils.ply import read_ply
+from utils.preprocessing import downsample_points, select_subdivision
+from utils.profiling import ShapeProfile, stage
 from utils.utils import (
     add_track_to_constraint,
+    color_attribute_type,
     create_camera,
     create_light,
     create_material,
     create_plane,
+    geometry_counts,
+    get_peak_memory,
     pcd_to_sphere,
     remove_objects,
     set_camera_params,
     set_engine_params,
     set_principled_node,
     set_render_params,
+    track_render_memory,
 )
 
 
@@ -41,80 +48,136 @@ def main():
     devices = [0]
     save_blender = True
     use_denoiser = True
+    # Directory of the geometry cache, None disables it
+    path_cache = None
+    cache = GeometryCache(path_cache) if path_cache is not None else None
     base_color = (1.0, 0.0, 0.0, 1.0)
     lens = 85
     plane_only_shadow = False
-
-    # Reset
-    remove_objects()
-
-    # Object
-    pcd = o3d.io.read_point_cloud(str(path_input))
-    pts = np.asarray(pcd.points)
-    colors = np.asarray(pcd.colors)
-    if len(colors):
-        pts = np.concatenate((pts, colors), axis=1)
-
-    focus_target_object = pcd_to_sphere(pts, radius=0.01, scale=1)  # type: ignore
-
-    if pts.shape[1] > 3:
-        mat = create_material("Material_Visualization", use_nodes=True, make_node_tree_empty=True)
-
-        output_node = mat.node_tree.nodes.new(type="ShaderNodeOutputMaterial")
-        principled_node = mat.node_tree.nodes.new(type="ShaderNodeBsdfPrincipled")
-        rgb_node = mat.node_tree.nodes.new(type="ShaderNodeRGB")
-        mix_node = mat.node_tree.nodes.new(type="ShaderNodeMixShader")
-        attrib_node = mat.node_tree.nodes.new(type="ShaderNodeAttribute")
-        attrib_node.attribute_name = "Col"
-        rgb_node.outputs["Color"].default_value = (0.1, 0.1, 0.1, 1.0)
-
-        mat.node_tree.links.new(attrib_node.outputs["Color"], principled_node.inputs["Base Color"])
-        mat.node_tree.links.new(principled_node.outputs["BSDF"], mix_node.inputs[1])
-        mat.node_tree.links.new(mix_node.outputs["Shader"], output_node.inputs["Surface"])
-    else:
-        # Material
-        mat = create_material("Material_Right", use_nodes=True, make_node_tree_empty=True)
-        output_node = mat.node_tree.nodes.new(type="ShaderNodeOutputMaterial")
-        principled_node = mat.node_tree.nodes.new(type="ShaderNodeBsdfPrincipled")
-        set_principled_node(principled_node, base_color=base_color)
-
-        mat.node_tree.links.new(principled_node.outputs["BSDF"], output_node.inputs["Surface"])
-
-    focus_target_object.data.materials.append(mat)
-    # Location Plane
-    if add_plane:
-        z_plane = (focus_target_object.dimensions[-1] * 0.5) + 0.1
-        loc_plane = (0.0, 0.0, -z_plane)
-        create_plane(size=100.0, location=loc_plane)
-        bpy.context.object.cycles.is_shadow_catcher = plane_only_shadow
-
-    # Camera
-    camera_object = create_camera(location=location_camera)
-    add_track_to_constraint(camera_object, focus_target_object)
-    set_camera_params(camera_object.data, focus_target_object, lens=lens)
-    scene = bpy.data.scenes["Scene"]
-    scene.camera = camera_object
-
-    # Light
-    light = create_light(location=loc_light, rotation=rot_light, name="sun", energy=energy)
-    bpy.context.collection.objects.link(light)
-
-    # Render Setting
-    path_render = path_out / f"{path_input.stem}.png"
-    set_render_params(
-        scene, path_render, resolution_x=res_x, resolution_y=res_y, use_transparent_bg=True
-    )
-    set_engine_params(
-        scene, ids_cuda_devices=devices, num_samples=num_samples, use_denoiser=use_denoiser
-    )
-
-    obj = bpy.data.objects["object"]
-    obj.rotation_euler = rot_object
-
-    bpy.ops.render.render(write_still=True)
-
-    if save_blender:
-        bpy.ops.wm.save_mainfile()
+    # "mesh" bakes one sphere per point, "instance" instances a single sphere,
+    # "points" renders analytic spheres (Blender 3.1+)
+    sphere_mode = "mesh"
+    radius_sphere = 0.01
+    subdivision = 2
+    # Point budget (None keeps all the points) reached with "voxel" or "fps" downsampling
+    max_points = None
+    downsampling = "voxel"
+    # If True choose the subdivision from the size of the spheres on screen
+    auto_subdivision = False
+
+    # JSONL log of the durations of the stages, None disables it
+    path_timings = path_out / "timings.jsonl"
+    # If True dump the cProfile stats of the render, readable with pstats
+    use_cprofile = False
+    path_pstats = path_out / f"{path_input.stem}.prof" if use_cprofile else None
+
+    if auto_subdivision:
+        distance = float(np.linalg.norm(location_camera))
+        subdivision = select_subdivision(radius_sphere, distance, lens=lens, resolution=res_x)
+
+    with ShapeProfile(
+        path_input.stem, path_log=path_timings, path_pstats=path_pstats, input=str(path_input)
+    ) as profile:
+        # Reset
+        with stage("reset"):
+            remove_objects()
+
+        # Object
+        with stage("load"):
+            pcd = read_ply(path_input)
+            pts = pcd["vertices"]
+            colors = pcd.get("colors", [])
+            if len(colors):
+                pts = np.concatenate((pts, colors), axis=1)
+
+            if max_points is not None:
+                pts = downsample_points(pts, max_points, method=downsampling)
+
+        with stage("build"):
+            focus_target_object = pcd_to_sphere(
+                pts,
+                radius=radius_sphere,
+                scale=1,
+                subdivision=subdivision,
+                mode=sphere_mode,
+                cache=cache,
+            )  # type: ignore
+
+        with stage("setup"):
+            if pts.shape[1] > 3:
+                mat = create_material(
+                    "Material_Visualization", use_nodes=True, make_node_tree_empty=True
+                )
+
+                output_node = mat.node_tree.nodes.new(type="ShaderNodeOutputMaterial")
+                principled_node = mat.node_tree.nodes.new(type="ShaderNodeBsdfPrincipled")
+                rgb_node = mat.node_tree.nodes.new(type="ShaderNodeRGB")
+                mix_node = mat.node_tree.nodes.new(type="ShaderNodeMixShader")
+                attrib_node = mat.node_tree.nodes.new(type="ShaderNodeAttribute")
+                attrib_node.attribute_name = "Col"
+                attrib_node.attribute_type = color_attribute_type(focus_target_object)
+                rgb_node.outputs["Color"].default_value = (0.1, 0.1, 0.1, 1.0)
+
+                mat.node_tree.links.new(
+                    attrib_node.outputs["Color"], principled_node.inputs["Base Color"]
+                )
+                mat.node_tree.links.new(principled_node.outputs["BSDF"], mix_node.inputs[1])
+                mat.node_tree.links.new(mix_node.outputs["Shader"], output_node.inputs["Surface"])
+            else:
+                # Material
+                mat = create_material("Material_Right", use_nodes=True, make_node_tree_empty=True)
+                output_node = mat.node_tree.nodes.new(type="ShaderNodeOutputMaterial")
+                principled_node = mat.node_tree.nodes.new(type="ShaderNodeBsdfPrincipled")
+                set_principled_node(principled_node, base_color=base_color)
+
+                mat.node_tree.links.new(
+                    principled_node.outputs["BSDF"], output_node.inputs["Surface"]
+                )
+
+            focus_target_object.data.materials.append(mat)
+            # Location Plane
+            if add_plane:
+                z_plane = (focus_target_object.dimensions[-1] * 0.5) + 0.1
+                loc_plane = (0.0, 0.0, -z_plane)
+                create_plane(size=100.0, location=loc_plane)
+                bpy.context.object.cycles.is_shadow_catcher = plane_only_shadow
+
+            # Camera
+            camera_object = create_camera(location=location_camera)
+            add_track_to_constraint(camera_object, focus_target_object)
+            set_camera_params(camera_object.data, focus_target_object, lens=lens)
+            scene = bpy.data.scenes["Scene"]
+            scene.camera = camera_object
+
+            # Light
+            light = create_light(location=loc_light, rotation=rot_light, name="sun", energy=energy)
+            bpy.context.collection.objects.link(light)
+
+            # Render Setting
+            path_render = path_out / f"{path_input.stem}.png"
+            set_render_params(
+                scene, path_render, resolution_x=res_x, resolution_y=res_y, use_transparent_bg=True
+            )
+            set_engine_params(
+                scene, ids_cuda_devices=devices, num_samples=num_samples, use_denoiser=use_denoiser
+            )
+
+            obj = bpy.data.objects["object"]
+            obj.rotation_euler = rot_object
+
+        profile.update(**geometry_counts(obj), samples=scene.cycles.samples)
+        track_render_memory()
+        with stage("render"):
+            bpy.ops.render.render()
+        with stage("write"):
+            bpy.data.images["Render Result"].save_render(str(path_render))
+        peak_memory = get_peak_memory()
+        profile.update(peak_render_mb=peak_memory["render"])
+        print(f"Peak memory ({sphere_mode}): {peak_memory}")
+
+        if save_blender:
+            with stage("save_blender"):
+                bpy.ops.wm.save_mainfile()
     bpy.ops.wm.read_factory_settings()
 
 
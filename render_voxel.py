@@ -8,8 +8,9 @@ from typing import List, Tuple
 
 import bpy
 import numpy as np
-import open3d as o3d
 
+from utils.cache import GeometryCache
+from utils.profiling import ShapeProfile, stage
 from utils.utils import (
     add_track_to_constraint,
     create_camera,
@@ -19,6 +20,7 @@ from utils.utils import (
     create_material,
     create_new_image_material,
     create_plane,
+    geometry_counts,
     remove_objects,
     set_camera_params,
     set_engine_params,
@@ -53,76 +55,100 @@ def main():
     add_plane = True
     save_blender = True
     use_denoiser = True
+    # Directory of the geometry cache, None disables it
+    path_cache = None
+    cache = GeometryCache(path_cache) if path_cache is not None else None
     base_color = (0.0, 1.0, 1.0, 1.0)
     lens = 85
     plane_only_shadow = True
-
-    # Reset
-    remove_objects()
-
-    # Object
-    focus_target_object = voxels_to_cube(
-        voxels=voxels,
-        radius=0.0125 / 2,
-        offset=(0.0, 0.0, 0.0),
-        scale=1.0,
-    )
-
-    # Location Plane
-    if add_plane:
-        z_plane = focus_target_object.dimensions[-1] * 0.5
-        loc_plane = (0.0, 0.0, -z_plane)
-        create_plane(size=100.0, location=loc_plane)
-        bpy.context.object.cycles.is_shadow_catcher = plane_only_shadow
-
-    # Material
-    material = create_material("Material_Voxel", use_nodes=True, make_node_tree_empty=True)
-    nodes = material.node_tree.nodes
-    links = material.node_tree.links
-
-    node_principled = nodes.new(type="ShaderNodeBsdfPrincipled")
-    set_principled_node(node_principled, base_color=base_color)
-
-    node_diff = nodes.new("ShaderNodeBsdfDiffuse")
-    node_output = nodes.new(type="ShaderNodeOutputMaterial")
-
-    # Create mix shader node
-    node_mix = nodes.new(type="ShaderNodeMixShader")
-    links.new(node_diff.outputs[0], node_mix.inputs[2])
-    links.new(node_principled.outputs[0], node_mix.inputs[1])
-    links.new(node_mix.outputs[0], node_output.inputs[0])
-
-    focus_target_object.data.materials.append(material)
-
-    # Camera
-    camera_object = create_camera(location=location_camera)
-    add_track_to_constraint(camera_object, focus_target_object)
-    set_camera_params(camera_object.data, focus_target_object, lens=lens)
-    scene = bpy.data.scenes["Scene"]
-    scene.camera = camera_object
-
-    # Light
-    light = create_light_area_vox(
-        location=loc_light, rotation=rot_light, name="area", energy=energy
-    )
-    bpy.context.collection.objects.link(light)
-
-    # Render Setting
-    path_render = path_out / f"{path_input.stem}.png"
-    set_render_params(
-        scene, path_render, resolution_x=res_x, resolution_y=res_y, use_transparent_bg=True
-    )
-    set_engine_params(
-        scene, ids_cuda_devices=devices, num_samples=num_samples, use_denoiser=use_denoiser
-    )
-
-    obj = bpy.data.objects["object"]
-    obj.rotation_euler = rot_object
-
-    bpy.ops.render.render(write_still=True)
-
-    if save_blender:
-        bpy.ops.wm.save_mainfile()
+    # "surface" and "greedy" emit only the exposed faces, with cubes filling their cells
+    voxel_mode = "cubes"
+
+    # JSONL log of the durations of the stages, None disables it
+    path_timings = path_out / "timings.jsonl"
+    # If True dump the cProfile stats of the render, readable with pstats
+    use_cprofile = False
+    path_pstats = path_out / f"{path_input.stem}.prof" if use_cprofile else None
+
+    with ShapeProfile(
+        path_input.stem, path_log=path_timings, path_pstats=path_pstats, input=str(path_input)
+    ) as profile:
+        # Reset
+        with stage("reset"):
+            remove_objects()
+
+        # Object
+        with stage("build"):
+            focus_target_object = voxels_to_cube(
+                voxels=voxels,
+                radius=0.0125 / 2 if voxel_mode == "cubes" else None,
+                offset=(0.0, 0.0, 0.0),
+                scale=1.0,
+                mode=voxel_mode,
+                cache=cache,
+            )
+
+        with stage("setup"):
+            # Location Plane
+            if add_plane:
+                z_plane = focus_target_object.dimensions[-1] * 0.5
+                loc_plane = (0.0, 0.0, -z_plane)
+                create_plane(size=100.0, location=loc_plane)
+                bpy.context.object.cycles.is_shadow_catcher = plane_only_shadow
+
+            # Material
+            material = create_material("Material_Voxel", use_nodes=True, make_node_tree_empty=True)
+            nodes = material.node_tree.nodes
+            links = material.node_tree.links
+
+            node_principled = nodes.new(type="ShaderNodeBsdfPrincipled")
+            set_principled_node(node_principled, base_color=base_color)
+
+            node_diff = nodes.new("ShaderNodeBsdfDiffuse")
+            node_output = nodes.new(type="ShaderNodeOutputMaterial")
+
+            # Create mix shader node
+            node_mix = nodes.new(type="ShaderNodeMixShader")
+            links.new(node_diff.outputs[0], node_mix.inputs[2])
+            links.new(node_principled.outputs[0], node_mix.inputs[1])
+            links.new(node_mix.outputs[0], node_output.inputs[0])
+
+            focus_target_object.data.materials.append(material)
+
+            # Camera
+            camera_object = create_camera(location=location_camera)
+            add_track_to_constraint(camera_object, focus_target_object)
+            set_camera_params(camera_object.data, focus_target_object, lens=lens)
+            scene = bpy.data.scenes["Scene"]
+            scene.camera = camera_object
+
+            # Light
+            light = create_light_area_vox(
+                location=loc_light, rotation=rot_light, name="area", energy=energy
+            )
+            bpy.context.collection.objects.link(light)
+
+            # Render Setting
+            path_render = path_out / f"{path_input.stem}.png"
+            set_render_params(
+                scene, path_render, resolution_x=res_x, resolution_y=res_y, use_transparent_bg=True
+            )
+            set_engine_params(
+                scene, ids_cuda_devices=devices, num_samples=num_samples, use_denoiser=use_denoiser
+            )
+
+            obj = bpy.data.objects["object"]
+            obj.rotation_euler = rot_object
+
+        profile.update(**geometry_counts(obj), samples=scene.cycles.samples)
+        with stage("render"):
+            bpy.ops.render.render()
+        with stage("write"):
+            bpy.data.images["Render Result"].save_render(str(path_render))
+
+        if save_blender:
+            with stage("save_blender"):
+                bpy.ops.wm.save_mainfile()
 
 
 if __name__ == "__main__":
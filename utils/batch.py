@@ -0,0 +1,851 @@
+"""
+Module containing the batch rendering of the jobs of a manifest.
+
+The configuration has the global parameters at the top level and the parameters of every
+shape type in the "mesh", "pcd" and "voxel" sections, see cfg/render.yaml.
+"""
+import json
+import math
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import bpy  # type: ignore
+import numpy as np
+
+from utils.cache import GeometryCache
+from utils.journal import Journal, temporary_path
+from utils.manifest import SHAPE_TYPES
+from utils.memory import PCD_MODES, estimate_memory_mb, fit_pcd, pcd_geometry, voxel_geometry
+from utils.ply import read_ply
+from utils.prefetch import Prefetcher
+from utils.preprocessing import downsample_points, select_subdivision
+from utils.profiling import ShapeProfile, should_profile, stage
+from utils.utils import (
+    add_track_to_constraint,
+    color_attribute_type,
+    create_camera,
+    create_light,
+    create_light_area_vox,
+    create_material,
+    create_plane,
+    geometry_counts,
+    get_peak_memory,
+    is_standard_view,
+    load_mesh,
+    orbit_locations,
+    pcd_to_sphere,
+    read_viewer_pixels,
+    remove_objects,
+    render_passes_paths,
+    set_border_from_object,
+    set_camera_params,
+    set_engine_params,
+    set_principled_node,
+    set_render_params,
+    set_render_passes,
+    set_viewer_node,
+    track_render_memory,
+    voxels_to_cube,
+)
+from utils.writer import ImageWriter, wait_images
+
+# Keys that change from shape to shape without changing the scene around the object.
+SHAPE_KEYS = ("input", "output", "index")
+
+
+def job_params(job: Dict[str, Any], cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge the global configuration, the one of the shape type and the overrides of a job.
+
+    Point clouds read from .ply use "ply_axis_transform" unless "axis_transform" is set, by the
+    configuration or by the job, even to null.
+
+    Args:
+        job: the job from the manifest.
+        cfg: the configuration.
+
+    Returns:
+        The parameters of the job.
+    """
+    params = {k: v for k, v in cfg.items() if k not in SHAPE_TYPES}
+    params.update(cfg.get(job["type"], {}))
+    params.update(job)
+
+    is_ply = params["type"] == "pcd" and Path(params["input"]).suffix.lower() == ".ply"
+    if is_ply and "axis_transform" not in job and params.get("axis_transform") is None:
+        params["axis_transform"] = params.get("ply_axis_transform")
+
+    return params
+
+
+def has_colors(params: Dict[str, Any], data: Any) -> bool:
+    """Check if the input of a job has per point or per vertex colors.
+
+    Args:
+        params: the parameters of the job.
+        data: the input returned by load_shape.
+
+    Returns:
+        True for (N, 6) point clouds and meshes with "colors".
+    """
+    if params["type"] == "pcd":
+        return data.shape[1] >= 6
+    if params["type"] == "mesh":
+        return data.get("colors") is not None
+
+    return False
+
+
+def scene_signature(params: Dict[str, Any], data: Any = None) -> str:
+    """Get a string identifying the scene of a job, equal for jobs that can share the scene.
+
+    The material depends on the colors of the input, so jobs with and without colors do not
+    share the scene.
+
+    Args:
+        params: the parameters of the job.
+        data: the input returned by load_shape, None ignores its colors. Defaults to None.
+
+    Returns:
+        The signature.
+    """
+    values = {k: v for k, v in params.items() if k not in SHAPE_KEYS}
+    if data is not None:
+        values["has_colors"] = has_colors(params, data)
+
+    return json.dumps(values, sort_keys=True)
+
+
+def radians(angles: List[float]) -> tuple:
+    """Convert a list of angles in degrees, as written in the configuration, to radians."""
+    return tuple(math.radians(angle) for angle in angles)
+
+
+def load_shape(params: Dict[str, Any]) -> Any:
+    """Load the input of a job, without touching the scene.
+
+    Args:
+        params: the parameters of the job.
+
+    Raises:
+        ValueError: if the input is empty or not finite, see check_shape.
+
+    Returns:
+        The (N, 3) or (N, 6) points for pcd, the occupancy grid for voxel, the arrays of read_ply
+        for mesh.
+    """
+    path_input = Path(params["input"])
+
+    if params["type"] == "voxel":
+        return check_shape(params, np.load(path_input)["voxel"])
+
+    if params["type"] == "mesh":
+        return check_shape(params, read_ply(path_input))
+
+    if path_input.suffix == ".npy":
+        pts = np.array(np.load(path_input)[params.get("index", 0)], dtype=float)
+    else:
+        pcd = read_ply(path_input)
+        pts = np.asarray(pcd["vertices"], dtype=float)
+        colors = pcd.get("colors", [])
+        if len(colors):
+            pts = np.concatenate((pts, colors), axis=1)
+
+    if params.get("axis_transform") is not None:
+        pts[:, :3] = pts[:, :3] @ np.asarray(params["axis_transform"], dtype=float).T
+
+    if params.get("max_points") is not None:
+        pts = downsample_points(pts, params["max_points"], method=params["downsampling"])
+
+    return check_shape(params, pts)
+
+
+def check_shape(params: Dict[str, Any], data: Any) -> Any:
+    """Check that the input of a job can be built.
+
+    Args:
+        params: the parameters of the job.
+        data: the input returned by load_shape.
+
+    Raises:
+        ValueError: if the points are not (N, 3) or (N, 6), the grid is not 3D, the input is
+            empty, the coordinates are not finite, the mesh has no faces or the faces index
+            missing vertices.
+
+    Returns:
+        The input.
+    """
+    path_input = params["input"]
+    if params["type"] == "voxel":
+        if data.ndim != 3 or not np.any(data):
+            raise ValueError(f"{path_input} has no occupied voxels in a 3D grid.")
+        return data
+
+    pts = data["vertices"] if params["type"] == "mesh" else data
+    if pts.ndim != 2 or pts.shape[0] == 0 or pts.shape[1] not in (3, 6):
+        raise ValueError(f"{path_input} has points of shape {pts.shape}, not (N, 3) or (N, 6).")
+    if not np.all(np.isfinite(pts)):
+        raise ValueError(f"{path_input} has points that are not finite.")
+
+    faces = data.get("faces") if params["type"] == "mesh" else None
+    if params["type"] == "mesh" and (faces is None or data.get("face_sizes") is None):
+        raise ValueError(f"{path_input} has no faces, render it as a point cloud.")
+    if faces is not None and faces.size and (faces.min() < 0 or faces.max() >= pts.shape[0]):
+        raise ValueError(f"{path_input} has faces with missing vertices.")
+
+    return data
+
+
+def pcd_subdivision(params: Dict[str, Any]) -> int:
+    """Get the subdivision of a pcd job, from the size of the spheres on screen if automatic."""
+    if not params.get("auto_subdivision"):
+        return params["subdivision"]
+
+    distance = float(np.linalg.norm(params["location_camera"]))
+
+    return select_subdivision(
+        params["radius_sphere"], distance, lens=params["lens"], resolution=params["res_x"]
+    )
+
+
+def guard_memory(
+    params: Dict[str, Any], data: Any
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Fit a job within the "max_memory_mb" ceiling before building its geometry.
+
+    Point clouds switch to instanced or analytic spheres, then lower the subdivision of the
+    spheres, voxels switch from cubes to greedy surfaces if the cubes fill their cells, meshes
+    can only be skipped.
+
+    Args:
+        params: the parameters of the job.
+        data: the input returned by load_shape.
+
+    Returns:
+        The parameters, changed to fit, or None if the job cannot fit, and the reason of the
+        change or of the skip, None if the job fits as it is.
+    """
+    max_memory_mb = params.get("max_memory_mb")
+    if max_memory_mb is None:
+        return params, None
+
+    render = {
+        "resolution": (params["res_x"], params["res_y"]),
+        "num_passes": len((params.get("passes") or {}).get("names", [])),
+    }
+
+    if params["type"] == "pcd":
+        subdivision, mode = pcd_subdivision(params), params["sphere_mode"]
+        modes = PCD_MODES if bpy.app.version >= (3, 1, 0) else ("mesh",)
+        geometry = pcd_geometry(len(data), subdivision, mode)
+        memory = estimate_memory_mb(geometry, **render)
+        fit = fit_pcd(len(data), subdivision, mode, max_memory_mb, modes=modes, **render)
+        if fit == (subdivision, mode):
+            return params, None
+
+        reason = f"{len(data)} spheres with subdivision {subdivision} in {mode} mode need"
+        reason += f" {memory:.0f}MB, above {max_memory_mb}MB"
+        if fit is None:
+            return None, reason
+
+        changes = {"subdivision": fit[0], "sphere_mode": fit[1], "auto_subdivision": False}
+        return {**params, **changes}, f"{reason}: using subdivision {fit[0]} in {fit[1]} mode"
+
+    if params["type"] == "voxel":
+        mode = params["voxel_mode"]
+        memory = estimate_memory_mb(voxel_geometry(data, mode), **render)
+        if memory <= max_memory_mb:
+            return params, None
+
+        reason = f"{int(np.count_nonzero(data))} voxels in {mode} mode need {memory:.0f}MB,"
+        reason += f" above {max_memory_mb}MB"
+        # The surface modes need cubes filling their cells, see voxels_to_cube.
+        size_cells = params["scale"] / np.asarray(data.shape)
+        fills_cells = params["radius"] is None or np.allclose(2 * params["radius"], size_cells)
+        if mode == "cubes" and fills_cells:
+            memory_greedy = estimate_memory_mb(voxel_geometry(data, "greedy"), **render)
+            if memory_greedy <= max_memory_mb:
+                return {**params, "voxel_mode": "greedy"}, f"{reason}: using greedy mode"
+
+        return None, reason
+
+    num_triangles = 0
+    if data.get("face_sizes") is not None:
+        num_triangles = int(np.sum(data["face_sizes"] - 2))
+    geometry = {"vertices": data["vertices"].shape[0], "triangles": num_triangles}
+    memory = estimate_memory_mb(geometry, **render)
+    if memory <= max_memory_mb:
+        return params, None
+
+    return None, f"{num_triangles} triangles need {memory:.0f}MB, above {max_memory_mb}MB"
+
+
+def build_object(
+    params: Dict[str, Any],
+    data: Any,
+    cache: Optional[GeometryCache] = None,
+    target: Optional[bpy.types.Object] = None,
+) -> bpy.types.Object:
+    """Build the object of a job.
+
+    Args:
+        params: the parameters of the job.
+        data: the input returned by load_shape.
+        cache: the optional geometry cache. Defaults to None.
+        target: the optional object of the previous job whose mesh is replaced. Defaults to None.
+
+    Returns:
+        The object named "object".
+    """
+    if params["type"] == "mesh":
+        return load_mesh(Path(params["input"]), cache=cache, target=target, arrays=data)
+
+    if params["type"] == "voxel":
+        return voxels_to_cube(
+            data,
+            radius=params["radius"],
+            offset=params["offset"],
+            scale=params["scale"],
+            mode=params["voxel_mode"],
+            cache=cache,
+            target=target,
+        )
+
+    return pcd_to_sphere(
+        data,
+        radius=params["radius_sphere"],
+        offset=params["offset"],
+        scale=params["scale"],
+        subdivision=pcd_subdivision(params),
+        mode=params["sphere_mode"],
+        cache=cache,
+        target=target,
+    )
+
+
+def create_shape_material(params: Dict[str, Any], obj: bpy.types.Object) -> None:
+    """Create the material of a job and assign it to its object.
+
+    Meshes keep the material created by load_mesh.
+
+    Args:
+        params: the parameters of the job.
+        obj: the object of the job.
+    """
+    if params["type"] == "mesh":
+        return
+
+    if params["type"] == "voxel":
+        material = create_material("Material_Voxel", use_nodes=True, make_node_tree_empty=True)
+        nodes = material.node_tree.nodes
+        links = material.node_tree.links
+
+        node_principled = nodes.new(type="ShaderNodeBsdfPrincipled")
+        set_principled_node(node_principled, base_color=params["base_color"])
+        node_diff = nodes.new("ShaderNodeBsdfDiffuse")
+        node_output = nodes.new(type="ShaderNodeOutputMaterial")
+
+        node_mix = nodes.new(type="ShaderNodeMixShader")
+        links.new(node_diff.outputs[0], node_mix.inputs[2])
+        links.new(node_principled.outputs[0], node_mix.inputs[1])
+        links.new(node_mix.outputs[0], node_output.inputs[0])
+    elif params.get("use_color") and obj.data.attributes.get("Col") is not None:
+        material = create_material(
+            "Material_Visualization", use_nodes=True, make_node_tree_empty=True
+        )
+        nodes = material.node_tree.nodes
+        links = material.node_tree.links
+
+        output_node = nodes.new(type="ShaderNodeOutputMaterial")
+        principled_node = nodes.new(type="ShaderNodeBsdfPrincipled")
+        mix_node = nodes.new(type="ShaderNodeMixShader")
+        attrib_node = nodes.new(type="ShaderNodeAttribute")
+        attrib_node.attribute_name = "Col"
+        attrib_node.attribute_type = color_attribute_type(obj)
+
+        links.new(attrib_node.outputs["Color"], principled_node.inputs["Base Color"])
+        links.new(principled_node.outputs["BSDF"], mix_node.inputs[1])
+        links.new(mix_node.outputs["Shader"], output_node.inputs["Surface"])
+    else:
+        material = create_material("Material_Right", use_nodes=True, make_node_tree_empty=True)
+        nodes = material.node_tree.nodes
+
+        output_node = nodes.new(type="ShaderNodeOutputMaterial")
+        principled_node = nodes.new(type="ShaderNodeBsdfPrincipled")
+        set_principled_node(principled_node, base_color=params["base_color"])
+        links = material.node_tree.links
+        links.new(principled_node.outputs["BSDF"], output_node.inputs["Surface"])
+
+    obj.data.materials.append(material)
+
+
+def plane_height(params: Dict[str, Any], obj: bpy.types.Object) -> float:
+    """Get the height of the floor plane under an object."""
+    return -(obj.dimensions[-1] * 0.5 + params["plane_offset"])
+
+
+def can_encode(scene: bpy.types.Scene, path_render: Path) -> bool:
+    """Check if the images of a scene can be encoded by utils.writer as Blender saves them.
+
+    OpenEXR images are linear, the other formats need the view transform of the encoders.
+
+    Args:
+        scene: the scene to render.
+        path_render: the path to the rendered image.
+
+    Returns:
+        True if the images can be encoded outside Blender.
+    """
+    return path_render.suffix.lower() == ".exr" or is_standard_view(scene)
+
+
+def setup_scene(
+    params: Dict[str, Any], obj: bpy.types.Object, path_render: Path
+) -> Optional[bpy.types.Object]:
+    """Create the plane, camera and light of a job and set the render and engine parameters.
+
+    Args:
+        params: the parameters of the job.
+        obj: the object of the job.
+        path_render: the path to the rendered image.
+
+    Returns:
+        The floor plane, if any.
+    """
+    plane = None
+    if params["add_plane"]:
+        loc_plane = (0.0, 0.0, plane_height(params, obj))
+        plane = create_plane(size=params["plane_size"], location=loc_plane)
+        plane.cycles.is_shadow_catcher = params["plane_only_shadow"]
+
+    camera_object = create_camera(location=tuple(params["location_camera"]))
+    add_track_to_constraint(camera_object, obj)
+    set_camera_params(camera_object.data, obj, lens=params["lens"])
+    scene = bpy.data.scenes["Scene"]
+    scene.camera = camera_object
+
+    if params["light"] == "area":
+        light = create_light_area_vox(
+            location=tuple(params["location_light"]),
+            rotation=radians(params["rotation_light"]),
+            name="area",
+            energy=params["energy"],
+        )
+    else:
+        light = create_light(
+            location=tuple(params["location_light"]),
+            rotation=radians(params["rotation_light"]),
+            name="sun",
+            energy=params["energy"],
+        )
+    bpy.context.collection.objects.link(light)
+
+    set_render_params(
+        scene,
+        path_render,
+        resolution_x=params["res_x"],
+        resolution_y=params["res_y"],
+        use_transparent_bg=True,
+        num_threads=params.get("num_threads", 0),
+        use_persistent_data=bool(params.get("views")),
+    )
+    sampling = params.get("sampling") or {}
+    set_engine_params(
+        scene,
+        ids_cuda_devices=params["devices"],
+        num_samples=sampling.get("max_samples") or params["num_samples"],
+        use_adaptive_sampling=sampling.get("use_adaptive_sampling", False),
+        adaptive_threshold=sampling.get("adaptive_threshold", 0.01),
+        adaptive_min_samples=sampling.get("adaptive_min_samples", 0),
+        time_limit=sampling.get("time_limit", 0.0),
+        use_denoiser=sampling.get("use_denoiser", params["use_denoiser"]),
+        denoiser=params.get("denoiser"),
+        device=params.get("device", "GPU"),
+        tile_size=params.get("tile_size"),
+    )
+
+    passes = params.get("passes")
+    if passes:
+        set_render_passes(
+            scene,
+            passes["names"],
+            multilayer=passes.get("multilayer", True),
+            color_depth=str(passes.get("color_depth", "16")),
+            exr_codec=passes.get("exr_codec", "ZIP"),
+        )
+        # The object is white in the mask pass.
+        obj.pass_index = 1
+
+    if params.get("view_transform"):
+        scene.view_settings.view_transform = params["view_transform"]
+
+    if params.get("writer"):
+        set_viewer_node(scene)
+        if not can_encode(scene, path_render):
+            transform = scene.view_settings.view_transform
+            print(f"The writer needs the Standard view transform, not {transform}, using Blender")
+
+    obj.rotation_euler = radians(params["rotation_object"])
+
+    return plane
+
+
+class BatchRenderer:
+    """Render jobs one after the other, reusing the scene between jobs with the same signature.
+
+    Use it as a context manager, or call close, to stop the processes of the writer.
+    """
+
+    def __init__(self, cfg: Dict[str, Any]) -> None:
+        """Create the renderer.
+
+        Args:
+            cfg: the configuration.
+        """
+        self.cfg = cfg
+        self.cache = None
+        if cfg.get("path_cache") is not None:
+            max_size_mb = cfg.get("max_cache_size_mb", 4096.0)
+            self.cache = GeometryCache(Path(cfg["path_cache"]), max_size_mb=max_size_mb)
+
+        # The images are encoded in the background, see utils.writer.
+        self.writer = None
+        if cfg.get("writer"):
+            options = dict(cfg["writer"])
+            self.writer = ImageWriter(num_workers=options.pop("num_workers", 2), **options)
+
+        self.signature: Optional[str] = None
+        self.obj: Optional[bpy.types.Object] = None
+        self.plane: Optional[bpy.types.Object] = None
+
+    def __enter__(self) -> "BatchRenderer":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Wait for the images still being written and stop the writer."""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def reset(self) -> None:
+        """Drop the current scene, the next job builds it from scratch."""
+        if self.obj is not None:
+            bpy.ops.wm.read_factory_settings()
+
+        self.signature = None
+        self.obj = None
+        self.plane = None
+
+    def profile(self, job: Dict[str, Any]) -> ShapeProfile:
+        """Create the profile of one job, logged to "path_timings" if set.
+
+        The jobs whose output stem matches one of the patterns in "profile": {"shapes": [...]}
+        are also profiled with cProfile, dumping <stem>.prof in "profile": {"dir": ...}, by
+        default next to the output.
+
+        Args:
+            job: the job from the manifest.
+
+        Returns:
+            The profile.
+        """
+        path_output = Path(job["output"])
+        profile = self.cfg.get("profile") or {}
+        path_pstats = None
+        if should_profile(path_output.stem, profile.get("shapes")):
+            dir_pstats = Path(profile.get("dir") or path_output.parent)
+            path_pstats = dir_pstats / f"{path_output.stem}.prof"
+
+        return ShapeProfile(
+            path_output.stem,
+            path_log=self.cfg.get("path_timings"),
+            path_pstats=path_pstats,
+            input=job["input"],
+            output=job["output"],
+        )
+
+    def render(self, job: Dict[str, Any], data: Any = None) -> Dict[str, Any]:
+        """Render one job.
+
+        The durations of the stages are recorded in a ShapeProfile, see profile. Jobs above
+        the "max_memory_mb" ceiling are changed to fit or skipped, see guard_memory.
+
+        Args:
+            job: the job from the manifest.
+            data: the input of the job already returned by load_shape, if None it is loaded.
+                Defaults to None.
+
+        Returns:
+            The result of the job, with the "time" and "render_time" in seconds, the
+            "peak_memory" in MB, the durations of the "stages" and the "memory_guard" reason if
+            the job was changed to fit. Skipped jobs have status "too_large" and the "reason".
+        """
+        time_start = time.time()
+        with self.profile(job) as profile:
+            params = job_params(job, self.cfg)
+            profile.update(prefetched=data is not None)
+            if data is None:
+                with stage("load"):
+                    data = load_shape(params)
+
+            params, reason = guard_memory(params, data)
+            if reason is not None:
+                print(f"{'Skip' if params is None else 'Change'} {job['input']}: {reason}")
+                profile.update(memory_guard=reason)
+            if params is None:
+                return {
+                    "input": job["input"],
+                    "output": job["output"],
+                    "status": "too_large",
+                    "reason": reason,
+                    "time": time.time() - time_start,
+                }
+
+            signature = scene_signature(params, data)
+            reuse = params["reuse_scene"] and self.obj is not None and signature == self.signature
+            if not reuse:
+                with stage("reset"):
+                    self.reset()
+                    remove_objects()
+
+            path_render = Path(params["output"])
+            path_render.parent.mkdir(exist_ok=True, parents=True)
+
+            target = self.obj if reuse else None
+            with stage("build"):
+                obj = build_object(params, data, cache=self.cache, target=target)
+
+            with stage("setup"):
+                if reuse:
+                    if self.plane is not None:
+                        self.plane.location[2] = plane_height(params, obj)
+                else:
+                    create_shape_material(params, obj)
+                    self.plane = setup_scene(params, obj, path_render)
+                    self.obj = obj
+                    self.signature = signature
+
+            scene = bpy.data.scenes["Scene"]
+            profile.update(
+                **geometry_counts(obj),
+                samples=scene.cycles.samples,
+                adaptive_sampling=scene.cycles.use_adaptive_sampling,
+                reused_scene=reuse,
+            )
+
+            track_render_memory()
+            time_render = time.time()
+            paths_output = self.render_views(params, path_render)
+            time_render = time.time() - time_render
+
+            if params["save_blender"]:
+                with stage("save_blender"):
+                    bpy.ops.wm.save_mainfile(filepath=str(path_render.with_suffix(".blend")))
+
+            peak_memory = get_peak_memory()
+            profile.update(peak_render_mb=peak_memory["render"])
+
+        result = {
+            "input": job["input"],
+            "output": job["output"],
+            "status": "done",
+            "time": time.time() - time_start,
+            "render_time": time_render,
+            "peak_memory": peak_memory,
+            "stages": profile.entry["stages"],
+        }
+        if reason is not None:
+            result["memory_guard"] = reason
+        if params.get("views") or params.get("passes"):
+            result["outputs"] = [str(path) for path in paths_output]
+        print(f"Time one shape: {result['time']}, peak memory: {result['peak_memory']}")
+
+        return result
+
+    def render_views(self, params: Dict[str, Any], path_render: Path) -> List[Path]:
+        """Render the views of the current scene, moving the camera around the object.
+
+        Args:
+            params: the parameters of the job, with the optional "views" to render many views,
+                "passes" to write the render passes of every view and "border" to render only
+                the pixels of the object.
+            path_render: the path to the image, the views are saved as <stem>_<view>.png.
+
+        Returns:
+            The paths to the rendered images and passes.
+        """
+        scene = bpy.data.scenes["Scene"]
+        views = params.get("views")
+        if views:
+            locations = orbit_locations(
+                tuple(params["location_camera"]), views["num_azimuths"], views.get("elevations")
+            )
+            paths_view = [
+                path_render.with_name(f"{path_render.stem}_{i:03d}{path_render.suffix}")
+                for i in range(len(locations))
+            ]
+        else:
+            locations = [tuple(params["location_camera"])]
+            paths_view = [path_render]
+
+        paths_output = list(paths_view)
+        border = params.get("border")
+        for location, path_view in zip(locations, paths_view):
+            scene.camera.location = location
+            if border:
+                set_border_from_object(
+                    scene,
+                    scene.camera,
+                    self.obj,
+                    margin=border.get("margin", 16),
+                    use_crop=border.get("use_crop", False),
+                )
+            # Render to a temporary file renamed at the end, a crash never leaves a truncated image.
+            path_tmp = temporary_path(path_view)
+            scene.render.filepath = str(path_tmp)
+            dir_passes, paths_passes = None, {}
+            if params.get("passes"):
+                dir_passes, paths_passes = render_passes_paths(scene, path_view)
+
+            try:
+                with stage("render"):
+                    bpy.ops.render.render()
+                if self.writer is not None and can_encode(scene, path_view):
+                    with stage("read_pixels"):
+                        pixels = read_viewer_pixels()
+                    self.writer.submit(pixels, path_view)
+                else:
+                    with stage("write"):
+                        bpy.data.images["Render Result"].save_render(str(path_tmp))
+                    os.replace(path_tmp, path_view)
+                for path_pass_tmp, path_pass in paths_passes.items():
+                    os.replace(path_pass_tmp, path_pass)
+            finally:
+                path_tmp.unlink(missing_ok=True)
+                if dir_passes is not None:
+                    shutil.rmtree(dir_passes, ignore_errors=True)
+            paths_output += list(paths_passes.values())
+
+        return paths_output
+
+    def render_all(
+        self, jobs: List[Dict[str, Any]], journal: Optional[Journal] = None, max_attempts: int = 1
+    ) -> List[Dict[str, Any]]:
+        """Render a list of jobs, going on after a failure.
+
+        The inputs of the next jobs are loaded in the background while the current one renders,
+        as set by "prefetch": {"depth": ..., "max_memory_mb": ...}, see Prefetcher. With
+        "writer" the images are encoded in the background too, the entry of a job is appended
+        to the journal once its images are written, with their "encode_time".
+
+        Args:
+            jobs: the jobs to render.
+            journal: the optional journal where every attempt is appended. The jobs already done
+                with a valid output are skipped, the failed ones are retried. Defaults to None.
+            max_attempts: the maximum number of attempts of a job, including the failed
+                attempts in the journal. Defaults to 1.
+
+        Returns:
+            The last result of every job, the failed ones with status "failed", the job and the
+            "error", the ones above the memory ceiling with status "too_large", see render.
+        """
+        results = {}
+        pending = []
+        for i, job in enumerate(jobs):
+            if journal is not None and journal.is_done(job):
+                print(f"Skip {job['input']}, already done")
+                results[i] = journal.latest(job)
+                continue
+
+            attempts = journal.attempts(job) if journal is not None else 0
+            if attempts >= max_attempts:
+                print(f"Skip {job['input']}, failed {attempts} times")
+                results[i] = journal.latest(job)
+                continue
+
+            pending.append(i)
+
+        prefetch = self.cfg.get("prefetch") or {"depth": 0}
+        prefetcher = Prefetcher(
+            load_shape,
+            [job_params(jobs[i], self.cfg) for i in pending],
+            depth=prefetch.get("depth", 2),
+            max_memory_mb=prefetch.get("max_memory_mb", 1024.0),
+        )
+        writes = []
+        for i, data in zip(pending, prefetcher):
+            job = jobs[i]
+            attempts = journal.attempts(job) if journal is not None else 0
+            while attempts < max_attempts:
+                attempts += 1
+                time_start = time.time()
+                try:
+                    # Retries load the input again, a failed prefetch is loaded here as well.
+                    result = self.render(job, data=data)
+                except Exception as e:
+                    print(f"Failed {job['input']} (attempt {attempts}): {e!r}")
+                    result = {**job, "status": "failed", "time": time.time() - time_start}
+                    result["error"] = repr(e)
+                    self.reset()
+                data = None
+
+                result["attempt"] = attempts
+                handles = self.writer.take() if self.writer is not None else []
+                if result["status"] == "done" and handles:
+                    # The entry waits for the images, still being encoded.
+                    writes.append((i, result, handles))
+                    break
+                if journal is not None:
+                    journal.append(result)
+                if result["status"] in ("done", "too_large"):
+                    break
+
+            results[i] = result
+            self.finish_writes(writes, results, journal)
+
+        self.finish_writes(writes, results, journal, wait=True)
+
+        return [results[i] for i in range(len(jobs))]
+
+    def finish_writes(
+        self,
+        writes: List[Tuple[int, Dict[str, Any], List[Any]]],
+        results: Dict[int, Dict[str, Any]],
+        journal: Optional[Journal] = None,
+        wait: bool = False,
+    ) -> None:
+        """Complete the results of the jobs whose images were encoded by the writer.
+
+        Args:
+            writes: the position, the result and the pending images of every job, the completed
+                jobs are removed.
+            results: the results by position, updated with the "writes" of every image, the
+                total "encode_time" or the "error" of the writer.
+            journal: the optional journal where the completed results are appended.
+                Defaults to None.
+            wait: if True wait for all the images, otherwise complete only the jobs whose images
+                are already written. Defaults to False.
+        """
+        for entry in list(writes):
+            i, result, handles = entry
+            if not wait and not all(handle.ready() for handle in handles):
+                continue
+            writes.remove(entry)
+
+            written, error = wait_images(handles)
+            result["writes"] = written
+            result["encode_time"] = sum(image["encode_time"] for image in written)
+            if error is not None:
+                print(f"Failed to write {result['output']}: {error}")
+                result.update({"status": "failed", "error": error})
+            else:
+                print(f"Encoded {result['output']} in {result['encode_time']:.3f}s")
+
+            if journal is not None:
+                journal.append(result)
+            results[i] = result
@@ -0,0 +1,147 @@
+"""
+Module containing the timing, machine metadata and regression comparison of the benchmarks.
+"""
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+def time_case(
+    run: Callable[[], Any], repeats: int = 3, setup: Optional[Callable[[], Any]] = None
+) -> Dict[str, Any]:
+    """Time a benchmark case.
+
+    Args:
+        run: the function to time.
+        repeats: the number of runs. Defaults to 3.
+        setup: the optional function called before every run, not timed. Defaults to None.
+
+    Returns:
+        The "times" of the runs in seconds, their "min" and "median".
+    """
+    times = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        time_start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - time_start)
+
+    return {"times": times, "min": min(times), "median": statistics.median(times)}
+
+
+def cpu_model() -> str:
+    """Get the name of the CPU, from /proc/cpuinfo on Linux."""
+    path_cpuinfo = Path("/proc/cpuinfo")
+    if path_cpuinfo.exists():
+        for line in path_cpuinfo.read_text().splitlines():
+            if line.startswith("model name"):
+                return line.split(":", 1)[1].strip()
+
+    return platform.processor()
+
+
+def git_commit() -> Optional[str]:
+    """Get the commit of the repository, None if it is not a git checkout."""
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return output.stdout.strip()
+
+
+def machine_metadata(**extra: Any) -> Dict[str, Any]:
+    """Describe the machine and the software of a benchmark run.
+
+    Args:
+        extra: other entries, e.g. the version of Blender.
+
+    Returns:
+        The metadata.
+    """
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "cpu": cpu_model(),
+        "num_cpus": os.cpu_count(),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "commit": git_commit(),
+        **extra,
+    }
+
+
+def compare_results(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float = 0.1,
+) -> List[Dict[str, Any]]:
+    """Compare the cases of a run with a baseline run.
+
+    Args:
+        results: the timings of the run by case.
+        baseline: the timings of the baseline by case.
+        tolerance: the relative slowdown of the median time above which a case regressed.
+            Defaults to 0.1.
+
+    Returns:
+        One row for every case of either run, with the "ratio" between the median times and
+        "regression" True if the ratio is above 1 + tolerance. The cases of one run only have
+        the "missing" run, "current" or "baseline", and no ratio, the cases missing in the
+        current run, e.g. crashed, are regressions.
+    """
+    rows = []
+    for case in sorted(set(results) | set(baseline)):
+        if case not in results or case not in baseline:
+            missing = "current" if case not in results else "baseline"
+            rows.append(
+                {
+                    "case": case,
+                    "baseline": baseline.get(case, {}).get("median"),
+                    "current": results.get(case, {}).get("median"),
+                    "ratio": None,
+                    "regression": missing == "current",
+                    "missing": missing,
+                }
+            )
+            continue
+
+        ratio = results[case]["median"] / max(baseline[case]["median"], 1e-9)
+        rows.append(
+            {
+                "case": case,
+                "baseline": baseline[case]["median"],
+                "current": results[case]["median"],
+                "ratio": ratio,
+                "regression": ratio > 1.0 + tolerance,
+            }
+        )
+
+    return rows
+
+
+def print_comparison(rows: List[Dict[str, Any]]) -> None:
+    """Print the rows of compare_results as a table."""
+    print(f"{'case':<40} {'baseline [s]':>12} {'current [s]':>12} {'ratio':>7}")
+    flags = {"current": "  MISSING", "baseline": "  NEW"}
+    for row in rows:
+        baseline = "-" if row["baseline"] is None else f"{row['baseline']:.4f}"
+        current = "-" if row["current"] is None else f"{row['current']:.4f}"
+        ratio = "-" if row["ratio"] is None else f"{row['ratio']:.2f}"
+        flag = flags.get(row.get("missing"), "  REGRESSION" if row["regression"] else "")
+        print(f"{row['case']:<40} {baseline:>12} {current:>12} {ratio:>7}{flag}")
@@ -0,0 +1,146 @@
+"""
+Module containing the on disk cache of the built geometry.
+"""
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+def hash_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    """Compute the sha1 of the content of a file.
+
+    Args:
+        path: the path to the file.
+        chunk_size: the number of bytes read at a time. Defaults to 1MB.
+
+    Returns:
+        The hex digest of the file.
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def compact(array: np.ndarray) -> np.ndarray:
+    """Cast floats to float32 and wide integers to int32, the types consumed by foreach_set."""
+    array = np.asarray(array)
+    if array.dtype.kind == "f" and array.dtype != np.float32:
+        return array.astype(np.float32)
+    if array.dtype.kind in "iu" and array.dtype.itemsize > 4:
+        return array.astype(np.int32)
+
+    return array
+
+
+class GeometryCache:
+    """Content addressed cache of vertex and face arrays.
+
+    Every entry is a directory with one .npy file per array, saved as float32 or int32 and
+    loaded memory-mapped.
+    When the total size exceeds the limit the least recently used entries are removed.
+    """
+
+    def __init__(self, root: Path, max_size_mb: float = 4096.0) -> None:
+        """Create the cache.
+
+        Args:
+            root: the directory with the entries, created if missing.
+            max_size_mb: the maximum total size of the entries in MB. Defaults to 4096.
+        """
+        self.root = Path(root)
+        self.root.mkdir(exist_ok=True, parents=True)
+        self.max_size = max_size_mb * 1024 * 1024
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        """Compute the key of an entry.
+
+        Args:
+            parts: the inputs of the build, arrays are hashed by content, paths by file content
+                and everything else by repr.
+
+        Returns:
+            The key.
+        """
+        digest = hashlib.sha1()
+        for part in parts:
+            if isinstance(part, np.ndarray):
+                array = np.ascontiguousarray(part)
+                digest.update(f"{array.dtype}{array.shape}".encode())
+                digest.update(array.tobytes())
+            elif isinstance(part, Path):
+                digest.update(hash_file(part).encode())
+            else:
+                digest.update(repr(part).encode())
+            digest.update(b"|")
+
+        return digest.hexdigest()
+
+    def load(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """Load an entry.
+
+        Args:
+            key: the key of the entry.
+
+        Returns:
+            The memory-mapped arrays by name or None if the entry is missing.
+        """
+        path_entry = self.root / key
+        if not path_entry.is_dir():
+            return None
+
+        os.utime(path_entry)
+
+        return {path.stem: np.load(path, mmap_mode="r") for path in path_entry.glob("*.npy")}
+
+    def save(self, key: str, arrays: Dict[str, Optional[np.ndarray]]) -> None:
+        """Save an entry, then evict the least recently used other entries above the size limit.
+
+        Args:
+            key: the key of the entry.
+            arrays: the arrays by name, None values are skipped.
+        """
+        path_entry = self.root / key
+        path_tmp = self.root / f".{key}.{os.getpid()}"
+        path_tmp.mkdir(exist_ok=True)
+
+        for name, array in arrays.items():
+            if array is not None:
+                np.save(path_tmp / f"{name}.npy", np.ascontiguousarray(compact(array)))
+
+        try:
+            path_tmp.rename(path_entry)
+        except OSError:
+            # Another process saved the same entry in the meantime.
+            shutil.rmtree(path_tmp, ignore_errors=True)
+
+        self.evict(keep=key)
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Remove the least recently used entries until the total size is within the limit.
+
+        Args:
+            keep: the key of an entry never removed, e.g. the one just saved, even if it is larger
+                than the limit alone. Defaults to None.
+        """
+        entries = []
+        for path_entry in self.root.iterdir():
+            if path_entry.is_dir() and not path_entry.name.startswith("."):
+                size = sum(path.stat().st_size for path in path_entry.glob("*.npy"))
+                entries.append((path_entry.stat().st_mtime, size, path_entry))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path_entry in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if path_entry.name == keep:
+                continue
+            shutil.rmtree(path_entry, ignore_errors=True)
+            total_size -= size
@@ -0,0 +1,128 @@
+"""
+Module containing the journal of a batch run, to resume it after a crash.
+
+The journal is an append-only JSONL file with one entry for every attempt of a job, identified
+by its output. Many processes can append to the same journal.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+EXR_MAGIC = b"\x76\x2f\x31\x01"
+
+
+def is_valid_image(path: Path) -> bool:
+    """Check that an image exists and is not truncated.
+
+    PNG files must start with the signature and end with the IEND chunk, JPEG files with the
+    end of image marker, OpenEXR and WebP files must start with their magic number, any other
+    file must not be empty.
+
+    Args:
+        path: the path to the image.
+
+    Returns:
+        True if the image is complete.
+    """
+    path = Path(path)
+    if not path.is_file() or path.stat().st_size == 0:
+        return False
+
+    with open(path, "rb") as f:
+        head = f.read(8)
+        f.seek(max(0, path.stat().st_size - 12))
+        tail = f.read()
+
+    if path.suffix.lower() == ".png":
+        return head == PNG_SIGNATURE and tail[4:8] == b"IEND"
+    if path.suffix.lower() in (".jpg", ".jpeg"):
+        return tail.endswith(b"\xff\xd9")
+    if path.suffix.lower() == ".exr":
+        return head[:4] == EXR_MAGIC
+    if path.suffix.lower() == ".webp":
+        return head[:4] == b"RIFF"
+
+    return True
+
+
+def append_jsonl(path: Path, entry: Dict[str, Any]) -> None:
+    """Append an entry to a JSONL file and flush it to disk.
+
+    A single write on a file opened in append mode is not interleaved with other processes, many
+    processes can append to the same file.
+
+    Args:
+        path: the JSONL file, created if missing.
+        entry: the entry.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, (json.dumps(entry) + "\n").encode())
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def temporary_path(path: Path) -> Path:
+    """Get the path where an output is written before being renamed, in the same directory."""
+    path = Path(path)
+
+    return path.with_name(f".{path.stem}.{os.getpid()}.tmp{path.suffix}")
+
+
+class Journal:
+    """Append-only record of the attempts of the jobs of a batch run."""
+
+    def __init__(self, path: Path) -> None:
+        """Open a journal, reading the entries of the previous runs.
+
+        Args:
+            path: the JSONL file of the journal, created at the first entry.
+        """
+        self.path = Path(path)
+        self.entries: Dict[str, List[Dict[str, Any]]] = {}
+        self.reload()
+
+    def reload(self) -> None:
+        """Read again the journal, e.g. after other processes appended to it."""
+        self.entries = {}
+        if not self.path.exists():
+            return
+
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line of a crashed run can be truncated.
+                    continue
+                self.entries.setdefault(entry["output"], []).append(entry)
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        """Append an entry and flush it to disk.
+
+        Args:
+            entry: the result of one attempt of a job, with "output" and "status".
+        """
+        append_jsonl(self.path, entry)
+        self.entries.setdefault(entry["output"], []).append(entry)
+
+    def latest(self, job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Get the last entry of a job, None if it was never attempted."""
+        entries = self.entries.get(job["output"])
+
+        return entries[-1] if entries else None
+
+    def attempts(self, job: Dict[str, Any]) -> int:
+        """Get the number of failed attempts of a job."""
+        return sum(entry["status"] == "failed" for entry in self.entries.get(job["output"], []))
+
+    def is_done(self, job: Dict[str, Any]) -> bool:
+        """Check if a job was completed and its outputs, e.g. all its views, are still valid."""
+        entry = self.latest(job)
+        if entry is None or entry["status"] != "done":
+            return False
+
+        return all(is_valid_image(path) for path in entry.get("outputs", [job["output"]]))
@@ -0,0 +1,217 @@
+"""
+Module containing the launch of many render_batch.py workers on shards of a manifest.
+
+The workers share one journal, launching again the same manifest resumes the batch.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.journal import Journal
+from utils.manifest import save_manifest
+
+
+def split_jobs(jobs: List[Dict[str, Any]], num_shards: int) -> List[List[Dict[str, Any]]]:
+    """Split jobs in contiguous shards of almost the same size.
+
+    Contiguous shards keep together the neighbouring jobs of a manifest, that usually share
+    the scene.
+
+    Args:
+        jobs: the jobs to split.
+        num_shards: the number of shards.
+
+    Raises:
+        ValueError: if the number of shards is not positive.
+
+    Returns:
+        The non empty shards.
+    """
+    if num_shards < 1:
+        raise ValueError(f"The number of shards must be positive, got {num_shards}.")
+
+    size, remainder = divmod(len(jobs), num_shards)
+    shards = []
+    start = 0
+    for i in range(num_shards):
+        end = start + size + (1 if i < remainder else 0)
+        if end > start:
+            shards.append(jobs[start:end])
+        start = end
+
+    return shards
+
+
+def threads_per_worker(num_workers: int, num_cpus: Optional[int] = None) -> int:
+    """Split the CPU cores between the workers.
+
+    Args:
+        num_workers: the number of workers.
+        num_cpus: the number of cores, if None the cores available to this process.
+            Defaults to None.
+
+    Returns:
+        The number of threads of every worker, at least 1.
+    """
+    if num_cpus is None:
+        num_cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None
+        num_cpus = num_cpus or os.cpu_count() or 1
+
+    return max(1, num_cpus // num_workers)
+
+
+def worker_command(
+    path_manifest: Path,
+    path_journal: Path,
+    num_threads: int,
+    path_cfg: Path,
+    dir_cfg: Path,
+    blender: Optional[str] = "blender",
+    path_timings: Optional[Path] = None,
+) -> List[str]:
+    """Get the command running render_batch.py on one shard.
+
+    Args:
+        path_manifest: the manifest of the shard.
+        path_journal: the journal shared by the workers.
+        num_threads: the CPU threads of the worker.
+        path_cfg: the run configuration.
+        dir_cfg: the directory of the configurations.
+        blender: the Blender executable, if None render_batch.py runs with the current python
+            and the bpy module. Defaults to "blender".
+        path_timings: the optional stage log shared by the workers, if None every worker logs
+            to <shard>_timings.jsonl. Defaults to None.
+
+    Returns:
+        The command.
+    """
+    path_script = Path(__file__).resolve().parents[1] / "render_batch.py"
+    args = [str(path_manifest), "--cfg", str(path_cfg), "--cfg-dir", str(dir_cfg)]
+    args += ["--threads", str(num_threads), "--journal", str(path_journal)]
+    if path_timings is not None:
+        args += ["--timings", str(path_timings)]
+
+    if blender is None:
+        return [sys.executable, str(path_script)] + args
+
+    return [blender, "-b", "-P", str(path_script), "--"] + args
+
+
+def launch_workers(
+    jobs: List[Dict[str, Any]],
+    num_workers: int,
+    dir_out: Path,
+    path_cfg: Path,
+    dir_cfg: Path,
+    blender: Optional[str] = "blender",
+    num_cpus: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Render jobs with many worker processes, one shard of the jobs each.
+
+    The shards, the log of every worker, the journal and the stage log timings.jsonl are saved in
+    dir_out, the jobs already done in the journal are skipped.
+
+    Args:
+        jobs: the jobs to render.
+        num_workers: the number of workers.
+        dir_out: the directory of the shards, logs, journal, stage log and summary.
+        path_cfg: the run configuration.
+        dir_cfg: the directory of the configurations.
+        blender: the Blender executable, if None the workers run with the current python
+            and the bpy module. Defaults to "blender".
+        num_cpus: the number of cores shared by the workers, if None all the available ones.
+            Defaults to None.
+
+    Returns:
+        The summary, see summarize.
+    """
+    dir_out.mkdir(exist_ok=True, parents=True)
+    journal = Journal(dir_out / "journal.jsonl")
+    pending = [job for job in jobs if not journal.is_done(job)]
+    print(f"{len(jobs) - len(pending)}/{len(jobs)} jobs already done")
+
+    shards = split_jobs(pending, num_workers) if pending else []
+    num_threads = threads_per_worker(max(1, len(shards)), num_cpus)
+
+    time_start = time.time()
+    workers = []
+    for i, shard in enumerate(shards):
+        path_manifest = dir_out / f"shard_{i:03d}.jsonl"
+        save_manifest(shard, path_manifest)
+
+        command = worker_command(
+            path_manifest,
+            journal.path,
+            num_threads,
+            path_cfg,
+            dir_cfg,
+            blender=blender,
+            path_timings=dir_out / "timings.jsonl",
+        )
+        log = open(dir_out / f"shard_{i:03d}.log", "w")
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+        workers.append((shard, process, log))
+
+    print(f"Started {len(workers)} workers with {num_threads} threads each")
+
+    return_codes = {}
+    for i, (shard, process, log) in enumerate(workers):
+        return_codes[i] = process.wait()
+        log.close()
+
+    journal.reload()
+    results = []
+    for i, (shard, _, _) in enumerate(workers):
+        for job in shard:
+            result = journal.latest(job)
+            if result is None:
+                # The jobs after a crash of the worker have no entry.
+                error = f"Worker {i} exited with code {return_codes[i]}."
+                result = {**job, "status": "failed", "error": error}
+            results.append({**result, "worker": i})
+
+    summary = summarize(results, time.time() - time_start, len(shards), num_threads)
+    summary["num_skipped"] = len(jobs) - len(pending)
+    with open(dir_out / "summary.json", "w") as f:
+        json.dump(summary, f, indent=2)
+
+    return summary
+
+
+def summarize(
+    results: List[Dict[str, Any]], wall_time: float, num_workers: int, num_threads: int
+) -> Dict[str, Any]:
+    """Gather the results of the workers.
+
+    Args:
+        results: the results of all the jobs.
+        wall_time: the time in seconds from the start of the first worker to the end of the last.
+        num_workers: the number of workers.
+        num_threads: the threads of every worker.
+
+    Returns:
+        The counts, the times, the throughput in jobs per second, the failed jobs and the ones
+        skipped above the memory ceiling.
+    """
+    done = [result for result in results if result["status"] == "done"]
+    too_large = [result for result in results if result["status"] == "too_large"]
+    failed = [result for result in results if result["status"] not in ("done", "too_large")]
+    job_time = sum(result.get("time", 0.0) for result in done)
+
+    return {
+        "num_jobs": len(results),
+        "num_done": len(done),
+        "num_failed": len(failed),
+        "num_too_large": len(too_large),
+        "num_workers": num_workers,
+        "num_threads": num_threads,
+        "wall_time": wall_time,
+        "job_time": job_time,
+        "jobs_per_second": len(done) / wall_time if wall_time > 0 else 0.0,
+        "failed": failed,
+        "too_large": too_large,
+    }
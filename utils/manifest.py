@@ -0,0 +1,144 @@
+"""
+Module containing the manifests listing the shapes to render.
+
+A manifest is a CSV, JSONL or YAML file with one job per row. Every job has the path to the
+"input" shape, its "type" (mesh, pcd or voxel) and the path to the "output" image; any other
+key overrides the configuration of that shape type for the job only.
+"""
+import csv
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from utils.ply import read_header
+
+SHAPE_TYPES = ("mesh", "pcd", "voxel")
+SHAPE_SUFFIXES = {".npz": "voxel", ".npy": "pcd"}
+
+
+def guess_type(path: Path) -> Optional[str]:
+    """Guess the shape type of a file, PLY files with faces are meshes."""
+    if path.suffix == ".ply":
+        _, elements, _ = read_header(path)
+        has_faces = any(element.name == "face" and element.count for element in elements)
+        return "mesh" if has_faces else "pcd"
+
+    return SHAPE_SUFFIXES.get(path.suffix)
+
+
+def _parse_value(value: str) -> Any:
+    """Parse a CSV cell as a YAML scalar or list, e.g. "100" or "[0, 0, 30]"."""
+    return yaml.safe_load(value) if value.strip() else None
+
+
+def check_job(job: Dict[str, Any], position: int) -> Dict[str, Any]:
+    """Check that a job has the required keys and a known shape type.
+
+    Args:
+        job: the job to check.
+        position: the position of the job in the manifest, for the error messages.
+
+    Raises:
+        ValueError: if a required key is missing or the shape type is unknown.
+
+    Returns:
+        The job, with the paths converted to strings.
+    """
+    for key in ("input", "type", "output"):
+        if job.get(key) is None:
+            raise ValueError(f"Job {position} of the manifest has no {key}.")
+
+    if job["type"] not in SHAPE_TYPES:
+        raise ValueError(
+            f"Job {position} has unknown type {job['type']}, use one of {SHAPE_TYPES}."
+        )
+
+    job["input"] = str(job["input"])
+    job["output"] = str(job["output"])
+
+    return job
+
+
+def load_manifest(path: Path) -> List[Dict[str, Any]]:
+    """Load the jobs of a manifest.
+
+    Args:
+        path: the path to the .csv, .jsonl or .yaml manifest.
+
+    Raises:
+        ValueError: if the format of the manifest is unknown.
+
+    Returns:
+        The list of jobs.
+    """
+    path = Path(path)
+
+    if path.suffix == ".csv":
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        required = ("input", "type", "output")
+        jobs = [
+            {k: (v if k in required else _parse_value(v)) for k, v in row.items()} for row in rows
+        ]
+        jobs = [{k: v for k, v in job.items() if v is not None} for job in jobs]
+    elif path.suffix == ".jsonl":
+        with open(path) as f:
+            jobs = [json.loads(line) for line in f if line.strip()]
+    elif path.suffix in (".yaml", ".yml"):
+        with open(path) as f:
+            jobs = yaml.safe_load(f) or []
+    else:
+        raise ValueError(f"Unknown manifest format {path.suffix}, use .csv, .jsonl or .yaml.")
+
+    return [check_job(dict(job), i) for i, job in enumerate(jobs)]
+
+
+def save_manifest(jobs: List[Dict[str, Any]], path: Path) -> None:
+    """Save jobs to a JSONL manifest.
+
+    Args:
+        jobs: the jobs to save.
+        path: the path to the .jsonl manifest.
+    """
+    with open(path, "w") as f:
+        for job in jobs:
+            f.write(json.dumps(job) + "\n")
+
+
+def scan_jobs(
+    dir_input: Path,
+    pattern: str,
+    shape_type: Optional[str] = None,
+    dir_output: Optional[Path] = None,
+) -> List[Dict[str, Any]]:
+    """Create one job for every file matching a pattern in a directory tree.
+
+    Args:
+        dir_input: the directory to scan recursively.
+        pattern: the pattern of the files, e.g. "*.ply".
+        shape_type: the type of the shapes, if None it is guessed from the file. Defaults to None.
+        dir_output: the directory of the renders, mirroring the input tree. If None every render
+            is saved in a "render" directory next to its input. Defaults to None.
+
+    Raises:
+        ValueError: if the type of a file cannot be guessed.
+
+    Returns:
+        The sorted list of jobs.
+    """
+    jobs = []
+    for path in sorted(Path(dir_input).rglob(pattern)):
+        job_type = shape_type or guess_type(path)
+        if job_type is None:
+            raise ValueError(f"Cannot guess the type of {path}, pass it explicitly.")
+
+        if dir_output is None:
+            path_render = path.parent / "render" / f"{path.stem}.png"
+        else:
+            path_render = Path(dir_output) / path.relative_to(dir_input).with_suffix(".png")
+
+        jobs.append({"input": str(path), "type": job_type, "output": str(path_render)})
+
+    return jobs
@@ -0,0 +1,169 @@
+"""
+Module containing the estimation of the geometry and memory of a shape before building it.
+
+The memory is a rough model, linear in the number of vertices, triangles, instances and points,
+covering the arrays of the build, the Blender mesh and the Cycles copy with its BVH. Compare it
+with peak_render_mb in the timings log to calibrate the constants.
+"""
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Bytes of every element, summed over the build arrays, the Blender mesh and Cycles.
+BYTES_PER_VERTEX = 100.0
+BYTES_PER_TRIANGLE = 180.0
+BYTES_PER_INSTANCE = 1000.0
+BYTES_PER_POINT = 120.0
+# Bytes of every pixel of the render buffers, for the image and every pass.
+BYTES_PER_PIXEL = 64.0
+
+PCD_MODES = ("mesh", "instance", "points")
+
+
+def icosphere_counts(subdivision: int) -> Tuple[int, int]:
+    """Count the vertices and triangles of an icosphere as built by Blender.
+
+    Args:
+        subdivision: the subdivisions of the icosphere, 1 is the icosahedron.
+
+    Returns:
+        The number of vertices and triangles.
+    """
+    num_triangles = 20 * 4 ** (subdivision - 1)
+
+    return num_triangles // 2 + 2, num_triangles
+
+
+def pcd_geometry(num_points: int, subdivision: int, mode: str = "mesh") -> Dict[str, int]:
+    """Count the elements of the object built by pcd_to_sphere.
+
+    Args:
+        num_points: the number of points.
+        subdivision: the subdivisions of the icospheres.
+        mode: the mode of pcd_to_sphere. Defaults to "mesh".
+
+    Raises:
+        ValueError: if the mode is unknown.
+
+    Returns:
+        The number of "vertices", "triangles", "instances" and "points".
+    """
+    if mode not in PCD_MODES:
+        raise ValueError(f"Unknown point cloud mode {mode}.")
+
+    vertices_sphere, triangles_sphere = icosphere_counts(subdivision)
+    if mode == "mesh":
+        return {
+            "vertices": num_points * vertices_sphere,
+            "triangles": num_points * triangles_sphere,
+            "instances": 0,
+            "points": 0,
+        }
+    if mode == "instance":
+        return {
+            "vertices": num_points + vertices_sphere,
+            "triangles": triangles_sphere,
+            "instances": num_points,
+            "points": 0,
+        }
+
+    return {"vertices": num_points, "triangles": 0, "instances": 0, "points": num_points}
+
+
+def exposed_faces(voxels: np.ndarray) -> int:
+    """Count the faces of the occupied cells of a voxel grid not shared with another one."""
+    occupied = np.pad(np.asarray(voxels) > 0, 1)
+    num_faces = 0
+    for axis in range(3):
+        # A face is exposed where the occupancy changes between two neighbouring cells.
+        num_faces += int(np.count_nonzero(np.diff(occupied, axis=axis)))
+
+    return num_faces
+
+
+def voxel_geometry(voxels: np.ndarray, mode: str = "cubes") -> Dict[str, int]:
+    """Count the elements of the object built by voxels_to_cube.
+
+    The quads of "greedy" are counted as in "surface", an upper bound.
+
+    Args:
+        voxels: the occupancy grid.
+        mode: the mode of voxels_to_cube. Defaults to "cubes".
+
+    Raises:
+        ValueError: if the mode is unknown.
+
+    Returns:
+        The number of "vertices", "triangles", "instances" and "points".
+    """
+    if mode not in ("cubes", "surface", "greedy"):
+        raise ValueError(f"Unknown voxel mode {mode}.")
+
+    if mode == "cubes":
+        num_cubes = int(np.count_nonzero(voxels))
+        return {"vertices": 8 * num_cubes, "triangles": 12 * num_cubes, "instances": 0, "points": 0}
+
+    num_faces = exposed_faces(voxels)
+
+    return {"vertices": 4 * num_faces, "triangles": 2 * num_faces, "instances": 0, "points": 0}
+
+
+def estimate_memory_mb(
+    geometry: Dict[str, int], resolution: Sequence[int] = (800, 800), num_passes: int = 0
+) -> float:
+    """Estimate the memory needed to build and render a geometry.
+
+    Args:
+        geometry: the counts returned by pcd_geometry or voxel_geometry.
+        resolution: the resolution of the render. Defaults to (800, 800).
+        num_passes: the number of render passes besides the image. Defaults to 0.
+
+    Returns:
+        The memory in MB.
+    """
+    num_bytes = (
+        geometry["vertices"] * BYTES_PER_VERTEX
+        + geometry["triangles"] * BYTES_PER_TRIANGLE
+        + geometry.get("instances", 0) * BYTES_PER_INSTANCE
+        + geometry.get("points", 0) * BYTES_PER_POINT
+        + resolution[0] * resolution[1] * (1 + num_passes) * BYTES_PER_PIXEL
+    )
+
+    return num_bytes / (1024 * 1024)
+
+
+def fit_pcd(
+    num_points: int,
+    subdivision: int,
+    mode: str,
+    max_memory_mb: float,
+    modes: Sequence[str] = PCD_MODES,
+    **render: int,
+) -> Optional[Tuple[int, str]]:
+    """Find the closest point cloud representation within a memory ceiling.
+
+    The cheaper modes are tried first in the order mesh, instance and points, they look the same
+    and keep the requested subdivision, then the subdivision is lowered down to 1.
+
+    Args:
+        num_points: the number of points.
+        subdivision: the requested subdivisions of the icospheres.
+        mode: the requested mode of pcd_to_sphere.
+        max_memory_mb: the memory ceiling in MB.
+        modes: the modes available, e.g. only "mesh" before Blender 3.1. Defaults to all.
+        render: the resolution and num_passes of estimate_memory_mb.
+
+    Returns:
+        The subdivision and mode, the requested ones if they fit, None if nothing fits.
+    """
+    position = PCD_MODES.index(mode)
+    candidates = [(s, m) for s in range(subdivision, 0, -1) for m in PCD_MODES[position:]]
+
+    for candidate in candidates:
+        if candidate[1] not in modes:
+            continue
+        geometry = pcd_geometry(num_points, *candidate)
+        if estimate_memory_mb(geometry, **render) <= max_memory_mb:
+            return candidate
+
+    return None
@@ -0,0 +1,102 @@
+"""
+Module containing image quality metrics to compare renders.
+"""
+import math
+
+import numpy as np
+
+
+def to_gray(image: np.ndarray, background: float = 1.0) -> np.ndarray:
+    """Composite an image over a uniform background and convert it to luminance.
+
+    Args:
+        image: the (H, W, 3) or (H, W, 4) image in [0, 1].
+        background: the gray level of the background. Defaults to 1.0, white.
+
+    Returns:
+        The (H, W) luminance.
+    """
+    rgb = image[..., :3]
+    if image.shape[-1] == 4:
+        alpha = image[..., 3:]
+        rgb = rgb * alpha + background * (1.0 - alpha)
+
+    return rgb @ np.array([0.2126, 0.7152, 0.0722])
+
+
+def box_filter(image: np.ndarray, size: int) -> np.ndarray:
+    """Average an image over square windows, keeping only the windows inside the image.
+
+    Args:
+        image: the (H, W) image.
+        size: the side of the windows.
+
+    Returns:
+        The (H - size + 1, W - size + 1) averages.
+    """
+    sums = np.pad(image, ((1, 0), (1, 0))).cumsum(axis=0).cumsum(axis=1)
+    windows = sums[size:, size:] - sums[:-size, size:] - sums[size:, :-size] + sums[:-size, :-size]
+
+    return windows / size**2
+
+
+def ssim(image: np.ndarray, reference: np.ndarray, window: int = 7) -> float:
+    """Compute the mean structural similarity between the luminance of two images.
+
+    Args:
+        image: the (H, W, C) image in [0, 1].
+        reference: the (H, W, C) reference image in [0, 1].
+        window: the side of the square windows. Defaults to 7.
+
+    Returns:
+        The SSIM, 1 for identical images.
+    """
+    x = to_gray(image)
+    y = to_gray(reference)
+    c1 = 0.01**2
+    c2 = 0.03**2
+
+    mu_x = box_filter(x, window)
+    mu_y = box_filter(y, window)
+    var_x = box_filter(x * x, window) - mu_x**2
+    var_y = box_filter(y * y, window) - mu_y**2
+    cov = box_filter(x * y, window) - mu_x * mu_y
+
+    numerator = (2 * mu_x * mu_y + c1) * (2 * cov + c2)
+    denominator = (mu_x**2 + mu_y**2 + c1) * (var_x + var_y + c2)
+
+    return float(np.mean(numerator / denominator))
+
+
+def noise_level(image: np.ndarray) -> float:
+    """Estimate the standard deviation of the noise of an image, without a reference.
+
+    Uses the Laplacian based estimator of Immerkaer, "Fast Noise Variance Estimation", 1996,
+    on the pixels of the object when the image has an alpha channel.
+
+    Args:
+        image: the (H, W, 3) or (H, W, 4) image in [0, 1].
+
+    Returns:
+        The noise standard deviation, in [0, 1] units.
+    """
+    gray = to_gray(image)
+    laplacian = (
+        gray[:-2, :-2]
+        - 2 * gray[:-2, 1:-1]
+        + gray[:-2, 2:]
+        - 2 * gray[1:-1, :-2]
+        + 4 * gray[1:-1, 1:-1]
+        - 2 * gray[1:-1, 2:]
+        + gray[2:, :-2]
+        - 2 * gray[2:, 1:-1]
+        + gray[2:, 2:]
+    )
+
+    mask = np.ones(laplacian.shape, dtype=bool)
+    if image.shape[-1] == 4:
+        mask = image[1:-1, 1:-1, 3] > 0.999
+    if not mask.any():
+        return 0.0
+
+    return math.sqrt(math.pi / 2) / 6 * float(np.mean(np.abs(laplacian[mask])))
@@ -0,0 +1,236 @@
+"""
+Module containing a reader for PLY files into NumPy arrays.
+"""
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+PLY_TYPES = {
+    "char": "i1",
+    "int8": "i1",
+    "uchar": "u1",
+    "uint8": "u1",
+    "short": "i2",
+    "int16": "i2",
+    "ushort": "u2",
+    "uint16": "u2",
+    "int": "i4",
+    "int32": "i4",
+    "uint": "u4",
+    "uint32": "u4",
+    "float": "f4",
+    "float32": "f4",
+    "double": "f8",
+    "float64": "f8",
+}
+
+PLY_FORMATS = {"ascii": "", "binary_little_endian": "<", "binary_big_endian": ">"}
+
+
+class PlyElement:
+    """One element of a PLY header, e.g. vertex or face, with its properties."""
+
+    def __init__(self, name: str, count: int) -> None:
+        self.name = name
+        self.count = count
+        self.properties: List[Tuple[str, str]] = []
+        self.lists: List[Tuple[str, str, str]] = []
+
+    def dtype(self, byte_order: str) -> np.dtype:
+        """Get the dtype of one element without list properties.
+
+        Args:
+            byte_order: "<" or ">".
+
+        Returns:
+            The structured dtype.
+        """
+        return np.dtype([(name, byte_order + PLY_TYPES[t]) for name, t in self.properties])
+
+
+def read_header(path: Path) -> Tuple[str, List[PlyElement], int]:
+    """Read the header of a PLY file.
+
+    Args:
+        path: the path to the PLY file.
+
+    Raises:
+        ValueError: if the file is not a PLY file or its format is unknown.
+
+    Returns:
+        The format, the elements and the size of the header in bytes.
+    """
+    elements: List[PlyElement] = []
+    file_format = ""
+
+    with open(path, "rb") as f:
+        if f.readline().strip() != b"ply":
+            raise ValueError(f"{path} is not a PLY file.")
+
+        for line in iter(f.readline, b""):
+            words = line.decode("ascii").split()
+            if not words or words[0] in ("comment", "obj_info"):
+                continue
+            if words[0] == "format":
+                file_format = words[1]
+            elif words[0] == "element":
+                elements.append(PlyElement(words[1], int(words[2])))
+            elif words[0] == "property" and words[1] == "list":
+                elements[-1].lists.append((words[4], words[2], words[3]))
+            elif words[0] == "property":
+                elements[-1].properties.append((words[2], words[1]))
+            elif words[0] == "end_header":
+                break
+
+        size_header = f.tell()
+
+    if file_format not in PLY_FORMATS:
+        raise ValueError(f"Unknown PLY format {file_format} in {path}.")
+
+    return file_format, elements, size_header
+
+
+def _read_binary_lists(
+    data: np.ndarray, offset: int, element: PlyElement, byte_order: str
+) -> Tuple[Dict[str, np.ndarray], int]:
+    """Read an element with one list property, e.g. the faces, from the bytes of a binary file.
+
+    Args:
+        data: the bytes of the file as uint8 array.
+        offset: the offset of the element.
+        element: the element to read.
+        byte_order: "<" or ">".
+
+    Raises:
+        ValueError: if the element has scalar properties or more than one list.
+
+    Returns:
+        The flat "indices" and the "sizes" of the lists, and the offset after the element.
+    """
+    if element.properties or len(element.lists) != 1:
+        raise ValueError(f"Unsupported PLY element {element.name}.")
+
+    _, count_type, index_type = element.lists[0]
+    count_dtype = np.dtype(byte_order + PLY_TYPES[count_type])
+    index_dtype = np.dtype(byte_order + PLY_TYPES[index_type])
+
+    if element.count == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return {"indices": empty, "sizes": empty}, offset
+
+    # Fast path: all the lists have the length of the first one, e.g. a triangle mesh.
+    size = int(data[offset : offset + count_dtype.itemsize].view(count_dtype)[0])
+    row_dtype = np.dtype([("size", count_dtype), ("indices", index_dtype, (size,))])
+    end = offset + element.count * row_dtype.itemsize
+    if end <= data.shape[0]:
+        rows = data[offset:end].view(row_dtype)
+        if np.all(rows["size"] == size):
+            sizes = np.full(element.count, size, dtype=np.int64)
+            return {"indices": rows["indices"].astype(np.int64).ravel(), "sizes": sizes}, end
+
+    sizes = np.empty(element.count, dtype=np.int64)
+    indices = []
+    for i in range(element.count):
+        sizes[i] = data[offset : offset + count_dtype.itemsize].view(count_dtype)[0]
+        offset += count_dtype.itemsize
+        length = int(sizes[i]) * index_dtype.itemsize
+        indices.append(data[offset : offset + length].view(index_dtype))
+        offset += length
+
+    return {"indices": np.concatenate(indices).astype(np.int64), "sizes": sizes}, offset
+
+
+def _read_binary(
+    path: Path, elements: List[PlyElement], size_header: int, byte_order: str
+) -> Dict[str, Dict[str, np.ndarray]]:
+    """Read the elements of a binary PLY file, memory-mapping it."""
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    offset = size_header
+    content = {}
+
+    for element in elements:
+        if element.lists:
+            content[element.name], offset = _read_binary_lists(data, offset, element, byte_order)
+        else:
+            dtype = element.dtype(byte_order)
+            end = offset + element.count * dtype.itemsize
+            rows = data[offset:end].view(dtype)
+            content[element.name] = {name: rows[name] for name, _ in element.properties}
+            offset = end
+
+    return content
+
+
+def _read_ascii(
+    path: Path, elements: List[PlyElement], size_header: int
+) -> Dict[str, Dict[str, np.ndarray]]:
+    """Read the elements of an ascii PLY file."""
+    with open(path, "rb") as f:
+        f.seek(size_header)
+        lines = f.read().decode("ascii").splitlines()
+
+    lines = [line for line in lines if line.strip()]
+    start = 0
+    content = {}
+
+    for element in elements:
+        rows = lines[start : start + element.count]
+        start += element.count
+
+        if element.lists:
+            if element.properties or len(element.lists) != 1:
+                raise ValueError(f"Unsupported PLY element {element.name}.")
+            values = [[int(value) for value in row.split()] for row in rows]
+            sizes = np.array([row[0] for row in values], dtype=np.int64)
+            indices = np.array([v for row in values for v in row[1:]], dtype=np.int64)
+            content[element.name] = {"indices": indices, "sizes": sizes}
+        else:
+            table = np.array([row.split() for row in rows], dtype=float).reshape(element.count, -1)
+            content[element.name] = {
+                name: table[:, i].astype(PLY_TYPES[t])
+                for i, (name, t) in enumerate(element.properties)
+            }
+
+    return content
+
+
+def read_ply(path: Path) -> Dict[str, np.ndarray]:
+    """Read the vertices, colors and faces of an ascii or binary PLY file.
+
+    Binary files are memory-mapped, faces with the same number of corners are read in bulk.
+
+    Args:
+        path: the path to the PLY file.
+
+    Raises:
+        ValueError: if the file has no vertices or an unsupported format.
+
+    Returns:
+        The arrays in the format accepted by mesh_from_arrays: "vertices" (V, 3) and, if present,
+        "colors" (V, 3) in [0, 1], "faces" with the flat vertex indices and "face_sizes".
+    """
+    file_format, elements, size_header = read_header(Path(path))
+
+    if file_format == "ascii":
+        content = _read_ascii(Path(path), elements, size_header)
+    else:
+        content = _read_binary(Path(path), elements, size_header, PLY_FORMATS[file_format])
+
+    if "vertex" not in content:
+        raise ValueError(f"{path} has no vertices.")
+
+    vertex = content["vertex"]
+    arrays = {"vertices": np.stack((vertex["x"], vertex["y"], vertex["z"]), axis=1)}
+
+    if all(channel in vertex for channel in ("red", "green", "blue")):
+        colors = np.stack((vertex["red"], vertex["green"], vertex["blue"]), axis=1)
+        if np.issubdtype(colors.dtype, np.integer):
+            colors = colors / float(np.iinfo(colors.dtype).max)
+        arrays["colors"] = colors.astype(np.float64)
+
+    if "face" in content and content["face"]["sizes"].shape[0]:
+        arrays["faces"] = content["face"]["indices"]
+        arrays["face_sizes"] = content["face"]["sizes"]
+
+    return arrays
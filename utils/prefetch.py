@@ -0,0 +1,122 @@
+"""
+Module containing the background loading of the inputs of the next jobs.
+
+Blender holds the GIL while it renders, so the inputs are loaded in a forked process where
+available, in a thread otherwise.
+"""
+import multiprocessing
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Iterator, List, Optional
+
+import numpy as np
+
+
+def num_bytes(data: Any) -> int:
+    """Get the size of the arrays in a value, a dict, a list or a tuple of them."""
+    if isinstance(data, np.ndarray):
+        return data.nbytes
+    if isinstance(data, dict):
+        return sum(num_bytes(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return sum(num_bytes(value) for value in data)
+
+    return 0
+
+
+class Prefetcher:
+    """Bounded queue loading the next items in the background while the current one is used."""
+
+    def __init__(
+        self,
+        load: Callable[[Any], Any],
+        items: List[Any],
+        depth: int = 2,
+        max_memory_mb: float = 1024.0,
+        use_process: Optional[bool] = None,
+    ) -> None:
+        """Create the queue, loading starts when iterating over it.
+
+        Args:
+            load: the function loading one item, defined at module level to run in a process.
+            items: the items to load, in order.
+            depth: the maximum number of items loaded ahead, 0 loads nothing and yields None for
+                every item, to be loaded by the caller. Defaults to 2.
+            max_memory_mb: no more items are loaded ahead while the queued ones take more than
+                this memory, counting the ones still loading as the largest item loaded so far,
+                see queued_bytes. The next item is always loaded. Defaults to 1024.
+            use_process: if True load in a forked process, if False in a thread, if None in a
+                process where fork is available. Defaults to None.
+        """
+        self.load = load
+        self.items = items
+        self.depth = depth
+        self.max_bytes = max_memory_mb * 1024 * 1024
+        if use_process is None:
+            use_process = "fork" in multiprocessing.get_all_start_methods()
+        self.use_process = use_process
+
+        self.futures: Deque[Future] = deque()
+        self.position = 0
+        self.largest_bytes = 0
+
+    def queued_bytes(self) -> int:
+        """Estimate the size of the items queued and not used yet.
+
+        The size of the items still loading is unknown, they count as the largest item loaded so
+        far, so only the first items can be queued beyond the memory before any size is known.
+        """
+        total, num_loading = 0, 0
+        for future in self.futures:
+            if not future.done():
+                num_loading += 1
+            elif future.exception() is None:
+                size = num_bytes(future.result())
+                self.largest_bytes = max(self.largest_bytes, size)
+                total += size
+
+        return total + num_loading * self.largest_bytes
+
+    def fill(self, executor: Executor) -> None:
+        """Submit the next items within the depth and the memory of the queue."""
+        while (
+            self.position < len(self.items)
+            and len(self.futures) < self.depth
+            and (not self.futures or self.queued_bytes() < self.max_bytes)
+        ):
+            self.futures.append(executor.submit(self.load, self.items[self.position]))
+            self.position += 1
+
+    def __iter__(self) -> Iterator[Optional[Any]]:
+        """Iterate over the loaded items.
+
+        Yields:
+            The loaded item, None if loading it failed or depth is 0, e.g. to load it where the
+            error is handled.
+        """
+        if self.depth < 1:
+            for _ in self.items:
+                yield None
+            return
+
+        if self.use_process:
+            # Fork before the first render, the worker never touches the state of Blender.
+            context = multiprocessing.get_context("fork")
+            executor = ProcessPoolExecutor(max_workers=1, mp_context=context)
+        else:
+            executor = ThreadPoolExecutor(max_workers=1)
+
+        try:
+            for _ in self.items:
+                self.fill(executor)
+                future = self.futures.popleft()
+                try:
+                    data = future.result()
+                    self.largest_bytes = max(self.largest_bytes, num_bytes(data))
+                except Exception:
+                    data = None
+                # Load the next items while the caller uses this one.
+                self.fill(executor)
+                yield data
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
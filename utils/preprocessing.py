@@ -0,0 +1,156 @@
+"""
+Module containing the preprocessing of point clouds before building their geometry.
+"""
+import math
+
+import numpy as np
+
+
+def voxel_downsample(pts: np.ndarray, voxel_size: float) -> np.ndarray:
+    """Replace the points falling in the same cell of a regular grid with their centroid.
+
+    Args:
+        pts: the (N, 3) array with the points or the (N, 6) array with points and rgb colors.
+        voxel_size: the side of the cells of the grid.
+
+    Returns:
+        The (M, C) array with one point per occupied cell, colors are averaged as well.
+    """
+    cells = np.floor(pts[:, :3] / voxel_size).astype(np.int64)
+    cells -= cells.min(axis=0)
+    extent = cells.max(axis=0) + 1
+    keys = (cells[:, 0] * extent[1] + cells[:, 1]) * extent[2] + cells[:, 2]
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+
+    sums = np.zeros((counts.shape[0], pts.shape[1]), dtype=float)
+    for c in range(pts.shape[1]):
+        sums[:, c] = np.bincount(inverse, weights=pts[:, c], minlength=counts.shape[0])
+
+    return sums / counts[:, None]
+
+
+def farthest_point_sampling(pts: np.ndarray, num_points: int, seed: int = 0) -> np.ndarray:
+    """Select a subset of points iteratively picking the farthest point from the ones selected.
+
+    Runs in O(N * num_points), prefer voxel_downsample for very large clouds.
+
+    Args:
+        pts: the (N, 3) array with the points or the (N, 6) array with points and rgb colors.
+        num_points: the number of points to select.
+        seed: the seed to choose the first point. Defaults to 0.
+
+    Returns:
+        The (num_points, C) array with the selected points.
+    """
+    if num_points >= pts.shape[0]:
+        return pts
+
+    xyz = np.ascontiguousarray(pts[:, :3])
+    ids = np.empty(num_points, dtype=np.int64)
+    ids[0] = np.random.default_rng(seed).integers(pts.shape[0])
+    distances = np.full(pts.shape[0], np.inf)
+
+    for i in range(1, num_points):
+        delta = xyz - xyz[ids[i - 1]]
+        np.minimum(distances, np.einsum("ij,ij->i", delta, delta), out=distances)
+        ids[i] = np.argmax(distances)
+
+    return pts[ids]
+
+
+def downsample_points(pts: np.ndarray, max_points: int, method: str = "voxel") -> np.ndarray:
+    """Reduce a point cloud to a point budget.
+
+    Args:
+        pts: the (N, 3) array with the points or the (N, 6) array with points and rgb colors.
+        max_points: the maximum number of points to keep.
+        method: "voxel" for voxel grid downsampling, with the smallest cell size within the
+            budget, or "fps" for farthest point sampling. Defaults to "voxel".
+
+    Raises:
+        ValueError: if the method is unknown.
+
+    Returns:
+        The downsampled point cloud, pts itself if it is already within the budget.
+    """
+    if method not in ("voxel", "fps"):
+        raise ValueError(f"Unknown downsampling method {method}.")
+
+    if pts.shape[0] <= max_points:
+        return pts
+
+    if method == "fps":
+        return farthest_point_sampling(pts, max_points)
+
+    # The number of occupied cells decreases with their size: bisect on the size.
+    low = 0.0
+    high = float(np.max(np.ptp(pts[:, :3], axis=0))) or 1.0
+    downsampled = voxel_downsample(pts, high)
+    for _ in range(16):
+        middle = (low + high) / 2
+        candidate = voxel_downsample(pts, middle)
+        if candidate.shape[0] <= max_points:
+            high = middle
+            downsampled = candidate
+        else:
+            low = middle
+
+    # Even one cell per axis can leave up to 8 points, above very small budgets.
+    if downsampled.shape[0] > max_points:
+        return farthest_point_sampling(downsampled, max_points)
+
+    return downsampled
+
+
+def projected_sphere_size(
+    radius: float, distance: float, lens: float, resolution: int, sensor_width: float = 36.0
+) -> float:
+    """Approximate the diameter in pixels of a sphere seen by a perspective camera.
+
+    Args:
+        radius: the radius of the sphere.
+        distance: the distance between the sphere and the camera.
+        lens: the focal length of the camera in mm.
+        resolution: the horizontal resolution of the image in pixels.
+        sensor_width: the width of the sensor in mm. Defaults to 36.0.
+
+    Returns:
+        The diameter of the sphere on screen in pixels.
+    """
+    focal_pixels = lens / sensor_width * resolution
+
+    return 2.0 * radius * focal_pixels / distance
+
+
+def select_subdivision(
+    radius: float,
+    distance: float,
+    lens: float,
+    resolution: int,
+    tolerance: float = 0.5,
+    max_subdivision: int = 5,
+) -> int:
+    """Select the smallest icosphere subdivision whose silhouette error is below a tolerance.
+
+    An icosphere with subdivision s has about 5 * 2^s segments along a great circle,
+    the error is the distance in pixels between one segment and the circle.
+
+    Args:
+        radius: the radius of the spheres.
+        distance: the distance between the spheres and the camera.
+        lens: the focal length of the camera in mm.
+        resolution: the horizontal resolution of the image in pixels.
+        tolerance: the maximum silhouette error in pixels. Defaults to 0.5.
+        max_subdivision: the maximum subdivision to return. Defaults to 5.
+
+    Returns:
+        The subdivision for pcd_to_sphere, at least 1.
+    """
+    radius_pixels = projected_sphere_size(radius, distance, lens, resolution) / 2
+
+    for subdivision in range(1, max_subdivision):
+        num_segments = 5 * 2**subdivision
+        if radius_pixels * (1.0 - math.cos(math.pi / num_segments)) <= tolerance:
+            return subdivision
+
+    return max_subdivision
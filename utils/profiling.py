@@ -0,0 +1,150 @@
+"""
+Module containing the per-shape instrumentation of the renders.
+
+A ShapeProfile records the duration of the stages of one shape, e.g. load, build, setup, render
+and write, with any other value such as the size of the geometry, and appends them as one line
+to a JSONL log. The stages opened with stage() while a profile is active, e.g. by the builders in
+utils.utils, are recorded in that profile nested in the current stage.
+"""
+import cProfile
+import os
+import resource
+import time
+from contextlib import contextmanager
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from utils.journal import append_jsonl
+
+_ACTIVE_PROFILE: List[Optional["ShapeProfile"]] = [None]
+
+
+def peak_rss_mb() -> float:
+    """Get the peak resident memory of the process in MB, since it started."""
+    # ru_maxrss is in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def rss_mb() -> Optional[float]:
+    """Get the current resident memory of the process in MB, None where /proc is missing."""
+    try:
+        with open("/proc/self/statm") as f:
+            num_pages = int(f.read().split()[1])
+    except OSError:
+        return None
+
+    return num_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def should_profile(name: str, patterns: Optional[Sequence[str]]) -> bool:
+    """Check if a shape is selected for cProfile.
+
+    Args:
+        name: the name of the shape.
+        patterns: the fnmatch patterns of the selected shapes, None selects none.
+
+    Returns:
+        True if the name matches one of the patterns.
+    """
+    return any(fnmatch(name, pattern) for pattern in patterns or [])
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Record a stage in the active profile, doing nothing if no profile is active.
+
+    Args:
+        name: the name of the stage.
+    """
+    profile = _ACTIVE_PROFILE[0]
+    if profile is None:
+        yield
+        return
+
+    with profile.stage(name):
+        yield
+
+
+class ShapeProfile:
+    """Durations of the stages of one shape, logged as one JSONL entry."""
+
+    def __init__(
+        self,
+        name: str,
+        path_log: Optional[Path] = None,
+        path_pstats: Optional[Path] = None,
+        **values: Any,
+    ) -> None:
+        """Create the profile, recording starts when entering it as a context manager.
+
+        Args:
+            name: the name of the shape.
+            path_log: the optional JSONL log the entry is appended to. Defaults to None.
+            path_pstats: the optional file where the cProfile stats of the shape are dumped,
+                readable with pstats. Defaults to None.
+            values: other values of the entry, e.g. the input.
+        """
+        self.path_log = path_log
+        self.path_pstats = path_pstats
+        self.entry: Dict[str, Any] = {"shape": name, **values, "stages": {}}
+        self.stack: List[str] = []
+        self.profiler: Optional[cProfile.Profile] = None
+        self.previous: Optional[ShapeProfile] = None
+        self.time_start = 0.0
+        self.rss_start: Optional[float] = None
+
+    def __enter__(self) -> "ShapeProfile":
+        self.previous = _ACTIVE_PROFILE[0]
+        _ACTIVE_PROFILE[0] = self
+        self.rss_start = rss_mb()
+        if self.path_pstats is not None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.time_start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.entry["time"] = time.perf_counter() - self.time_start
+        # The peak of the process only grows during a batch, the change of the current memory
+        # is the one of this shape.
+        rss_end = rss_mb()
+        self.entry["rss_mb"] = rss_end
+        if rss_end is not None and self.rss_start is not None:
+            self.entry["rss_delta_mb"] = rss_end - self.rss_start
+        self.entry["process_peak_rss_mb"] = peak_rss_mb()
+        if exc_value is not None:
+            self.entry["error"] = repr(exc_value)
+        _ACTIVE_PROFILE[0] = self.previous
+
+        if self.profiler is not None:
+            self.profiler.disable()
+            Path(self.path_pstats).parent.mkdir(exist_ok=True, parents=True)
+            self.profiler.dump_stats(self.path_pstats)
+            self.entry["pstats"] = str(self.path_pstats)
+
+        if self.path_log is not None:
+            Path(self.path_log).parent.mkdir(exist_ok=True, parents=True)
+            append_jsonl(self.path_log, self.entry)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a stage, the durations of stages with the same name are added.
+
+        Args:
+            name: the name of the stage, prefixed by the names of the enclosing stages.
+        """
+        self.stack.append(name)
+        key = "/".join(self.stack)
+        time_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - time_start
+            self.entry["stages"][key] = self.entry["stages"].get(key, 0.0) + duration
+            self.stack.pop()
+
+    def update(self, **values: Any) -> None:
+        """Add values to the entry, e.g. the number of triangles."""
+        self.entry.update(values)
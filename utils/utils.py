@@ -4,13 +4,20 @@ Module containing generic utils.
 Author: Riccardo Spezialetti
 Mail: riccardo.spezialetti@unibo.it
 """
+import math
+import re
+import resource
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import bpy  # type: ignore
 import numpy as np
+from bpy_extras.object_utils import world_to_camera_view  # type: ignore
+from mathutils import Vector  # type: ignore
 
-import bmesh  # isort: skip
+from utils.cache import GeometryCache
+from utils.ply import read_ply
+from utils.profiling import stage
 
 
 def remove_objects() -> None:
@@ -28,6 +35,8 @@ def set_render_params(
     resolution_x: int = 1920,
     resolution_y: int = 1080,
     percentage_resolution: int = 100,
+    num_threads: int = 0,
+    use_persistent_data: bool = False,
 ) -> None:
     """Set Renderer Properties.
 
@@ -38,15 +47,44 @@ def set_render_params(
         resolution_x: the width for the image. Defaults to 1920.
         resolution_y: the height for the image. Defaults to 1080.
         percentage_resolution: the scale percentage for the resolutio of the image. Defaults to 100.
+        num_threads: the number of CPU threads for rendering, 0 uses all the cores. Defaults to 0.
+        use_persistent_data: If True keep the scene data, e.g. the BVH, between renders of the
+            same scene. Defaults to False.
     """
     scene.render.resolution_percentage = percentage_resolution
     scene.render.resolution_x = resolution_x
     scene.render.resolution_y = resolution_y
     scene.render.filepath = str(path_render)
-    scene.render.image_settings.file_format = path_render.suffix[1:].upper()
+    formats = {".exr": "OPEN_EXR", ".jpg": "JPEG"}
+    suffix = path_render.suffix.lower()
+    scene.render.image_settings.file_format = formats.get(suffix, suffix[1:].upper())
     scene.render.engine = "CYCLES"
     scene.render.use_motion_blur = False
     scene.render.film_transparent = use_transparent_bg
+    scene.render.threads_mode = "FIXED" if num_threads > 0 else "AUTO"
+    if num_threads > 0:
+        scene.render.threads = num_threads
+    scene.render.use_persistent_data = use_persistent_data
+
+
+_CYCLES_DEVICES_ENUMERATED = [False]
+
+
+def get_cycles_devices() -> List[Any]:
+    """Get the devices of Cycles, enumerated only once per process.
+
+    The devices are enumerated again only if the preferences were reset, e.g. by
+    read_factory_settings.
+
+    Returns:
+        The devices, with "name", "type" and "use".
+    """
+    preferences = bpy.context.preferences.addons["cycles"].preferences
+    if not _CYCLES_DEVICES_ENUMERATED[0] or not len(preferences.devices):
+        preferences.get_devices()
+        _CYCLES_DEVICES_ENUMERATED[0] = True
+
+    return list(preferences.devices)
 
 
 def set_engine_params(
@@ -55,61 +93,365 @@ def set_engine_params(
     ids_cuda_devices: List[int] = [],
     use_adaptive_sampling: bool = False,
     use_denoiser: bool = True,
+    device: str = "GPU",
+    tile_size: Optional[int] = None,
+    adaptive_threshold: float = 0.01,
+    adaptive_min_samples: int = 0,
+    time_limit: float = 0.0,
+    denoiser: Optional[str] = None,
 ) -> None:
     """Set Engine properties.
 
     Args:
         scene: the scene to render.
-        num_samples: The number of samples to render for cycles. Defaults to 4096.
+        num_samples: The number of samples to render for cycles, the maximum with adaptive sampling.
+            Defaults to 4096.
         ids_cuda_devices: Ids to use for rendering, if empty use all the availabe devices. Defaults to [].
         use_adaptive_sampling: If True use adaptive sampling. Defaults to False.
-        use_denoiser: If True use optix denoiser. Defaults to True.
+        use_denoiser: If True denoise the image. Defaults to True.
+        device: "GPU" to render with the CUDA devices, falling back to the CPU if none of them is
+            available, or "CPU". Defaults to "GPU".
+        tile_size: the size of the render tiles, if None keep the default of Blender.
+            Defaults to None.
+        adaptive_threshold: the noise level where adaptive sampling stops, lower is less noisy.
+            Defaults to 0.01.
+        adaptive_min_samples: the samples before adaptive sampling starts, 0 chooses them from
+            the threshold. Defaults to 0.
+        time_limit: the maximum render time of an image in seconds, 0 for no limit, needs
+            Blender 3.0+. Defaults to 0.0.
+        denoiser: "OPTIX", only on GPU, or "OPENIMAGEDENOISE", on any CPU. If None use OPTIX on
+            GPU and OPENIMAGEDENOISE on CPU. Defaults to None.
 
     Raises:
-        ValueError: if adaptive sampling is False and the number of samples is zero.
+        ValueError: if adaptive sampling is False and the number of samples is zero or the device
+            or the denoiser are unknown.
     """
 
     if not use_adaptive_sampling:
         if num_samples == 0:
             raise ValueError("Use adaptive sampling is false but num samples is zero.")
 
-    scene.view_layers[0].cycles.use_denoising = True
+    if device not in ("GPU", "CPU"):
+        raise ValueError(f"Unknown device {device}, use GPU or CPU.")
+
+    if denoiser not in (None, "OPTIX", "OPENIMAGEDENOISE"):
+        raise ValueError(f"Unknown denoiser {denoiser}, use OPTIX or OPENIMAGEDENOISE.")
 
     scene.cycles.use_adaptive_sampling = use_adaptive_sampling
-    if not use_adaptive_sampling:
+    if num_samples > 0:
         scene.cycles.samples = num_samples
-
-    cuda_devices = []
-    bpy.context.preferences.addons["cycles"].preferences.get_devices()
-    for dev in bpy.context.preferences.addons["cycles"].preferences.devices:
-        name = dev["name"]
-        dev["use"] = 0
-        if "NVIDIA" in name:
-            if name not in cuda_devices:
-                cuda_devices.append(name)
-
-    if len(ids_cuda_devices):
-        bpy.context.scene.cycles.device = "GPU"
+    if use_adaptive_sampling:
+        scene.cycles.adaptive_threshold = adaptive_threshold
+        scene.cycles.adaptive_min_samples = adaptive_min_samples
+    if hasattr(scene.cycles, "time_limit"):
+        scene.cycles.time_limit = time_limit
+
+    devices = get_cycles_devices()
+    cuda_devices = [dev for dev in devices if dev.type == "CUDA"]
+    for dev in devices:
+        dev.use = False
+
+    if device == "GPU":
+        if len(ids_cuda_devices):
+            missing = [id_dev for id_dev in ids_cuda_devices if id_dev >= len(cuda_devices)]
+            if missing:
+                print(f"CUDA devices {missing} not found, {len(cuda_devices)} available")
+            cuda_devices = [cuda_devices[i] for i in ids_cuda_devices if i < len(cuda_devices)]
+
+        if not cuda_devices:
+            print("No CUDA device available, rendering on CPU")
+            device = "CPU"
+
+    if device == "GPU":
         bpy.context.preferences.addons["cycles"].preferences.compute_device_type = "CUDA"
+        for dev in cuda_devices:
+            dev.use = True
+    else:
+        bpy.context.preferences.addons["cycles"].preferences.compute_device_type = "NONE"
+        for dev in devices:
+            dev.use = dev.type == "CPU"
+    scene.cycles.device = device
+
+    if tile_size is not None:
+        if hasattr(scene.cycles, "tile_size"):
+            # Blender 3.0+ renders the whole image at once unless tiling is enabled.
+            scene.cycles.use_auto_tile = True
+            scene.cycles.tile_size = tile_size
+        else:
+            scene.render.tile_x = tile_size
+            scene.render.tile_y = tile_size
+
+    scene.cycles.use_denoising = use_denoiser
+    scene.view_layers[0].cycles.use_denoising = use_denoiser
+    if use_denoiser:
+        # OptiX needs an NVIDIA GPU, Open Image Denoise runs on any CPU.
+        if denoiser == "OPTIX" and device == "CPU":
+            print("The OptiX denoiser needs a GPU, using Open Image Denoise")
+            denoiser = "OPENIMAGEDENOISE"
+        scene.cycles.denoiser = denoiser or ("OPTIX" if device == "GPU" else "OPENIMAGEDENOISE")
+        # Albedo and normal guide the denoiser, keeping thin details at low sample counts.
+        scene.cycles.denoising_input_passes = "RGB_ALBEDO_NORMAL"
+        if scene.cycles.denoiser == "OPENIMAGEDENOISE":
+            scene.cycles.denoising_prefilter = "ACCURATE"
+
+    devices_enable = [dev.name for dev in devices if dev.use]
+    print(f"Devices for rendering: {devices_enable}")
+
+
+def set_border_from_object(
+    scene: bpy.types.Scene,
+    camera_object: bpy.types.Object,
+    obj: bpy.types.Object,
+    margin: int = 16,
+    use_crop: bool = False,
+) -> bool:
+    """Render only the region of the image covered by an object, plus a margin.
+
+    The region is the projection of the bounding box of the object through the camera, the
+    pixels outside it, e.g. the shadow on a floor plane, are transparent.
+
+    Args:
+        scene: the scene to render.
+        camera_object: the camera of the scene.
+        obj: the object to frame.
+        margin: the pixels added on every side of the region. Defaults to 16.
+        use_crop: If True save only the region, otherwise the full image with the pixels
+            outside the region transparent. Defaults to False.
+
+    Returns:
+        True if the border is enabled, False if the object is not in front of the camera and the
+        whole image is rendered.
+    """
+    # The camera must follow its track to constraint before the projection.
+    bpy.context.view_layer.update()
+    obj_eval = obj.evaluated_get(bpy.context.evaluated_depsgraph_get())
+    corners = [
+        world_to_camera_view(scene, camera_object, obj.matrix_world @ Vector(corner))
+        for corner in obj_eval.bound_box
+    ]
+
+    scene.render.use_border = False
+    scene.render.use_crop_to_border = use_crop
+    if any(corner.z <= 0.0 for corner in corners):
+        return False
+
+    scale = scene.render.resolution_percentage / 100
+    margin_x = margin / (scene.render.resolution_x * scale)
+    margin_y = margin / (scene.render.resolution_y * scale)
+    scene.render.border_min_x = max(0.0, min(corner.x for corner in corners) - margin_x)
+    scene.render.border_max_x = min(1.0, max(corner.x for corner in corners) + margin_x)
+    scene.render.border_min_y = max(0.0, min(corner.y for corner in corners) - margin_y)
+    scene.render.border_max_y = min(1.0, max(corner.y for corner in corners) + margin_y)
+    scene.render.use_border = True
+
+    return True
+
+
+# Name of every render pass: view layer flag and output of the render layers node.
+RENDER_PASSES = {
+    "depth": ("use_pass_z", "Depth"),
+    "normal": ("use_pass_normal", "Normal"),
+    "albedo": ("use_pass_diffuse_color", "DiffCol"),
+    "mask": ("use_pass_object_index", "IndexOB"),
+}
+
+
+def set_render_passes(
+    scene: bpy.types.Scene,
+    passes: List[str],
+    multilayer: bool = True,
+    color_depth: str = "16",
+    exr_codec: str = "ZIP",
+) -> bpy.types.Node:
+    """Enable render passes and write them in the same render with a compositor file output.
+
+    The objects with pass index 1 are white in the mask pass. The nodes are reused when called
+    again on the same scene.
+
+    Args:
+        scene: the scene to render.
+        passes: the passes among "depth", "normal", "albedo" and "mask".
+        multilayer: If True write all the passes in one multilayer OpenEXR, otherwise one OpenEXR
+            for every pass. Defaults to True.
+        color_depth: "16" for half float or "32" for float. Defaults to "16".
+        exr_codec: the OpenEXR compression, e.g. "ZIP", "PIZ", "DWAA" or "NONE". Defaults to "ZIP".
+
+    Raises:
+        ValueError: if a pass is unknown.
+
+    Returns:
+        The file output node, named "Passes".
+    """
+    unknown = [name for name in passes if name not in RENDER_PASSES]
+    if unknown:
+        raise ValueError(f"Unknown render passes {unknown}, use {list(RENDER_PASSES)}.")
+
+    view_layer = scene.view_layers[0]
+    for name in passes:
+        setattr(view_layer, RENDER_PASSES[name][0], True)
+
+    scene.use_nodes = True
+    nodes = scene.node_tree.nodes
+    links = scene.node_tree.links
+    node_layers = next(node for node in nodes if node.type == "R_LAYERS")
+
+    node_output = nodes.get("Passes") or nodes.new(type="CompositorNodeOutputFile")
+    node_output.name = "Passes"
+    node_output.format.file_format = "OPEN_EXR_MULTILAYER" if multilayer else "OPEN_EXR"
+    node_output.format.color_depth = color_depth
+    node_output.format.exr_codec = exr_codec
+    node_output.file_slots.clear()
+
+    for name in passes:
+        node_output.file_slots.new(name)
+        socket = node_layers.outputs[RENDER_PASSES[name][1]]
+        if name == "mask":
+            node_mask = nodes.get("Mask") or nodes.new(type="CompositorNodeIDMask")
+            node_mask.name = "Mask"
+            node_mask.index = 1
+            node_mask.use_antialiasing = True
+            links.new(socket, node_mask.inputs["ID value"])
+            socket = node_mask.outputs["Alpha"]
+        links.new(socket, node_output.inputs[name])
+
+    return node_output
+
+
+def render_passes_paths(
+    scene: bpy.types.Scene, path_render: Path
+) -> Tuple[Path, Dict[Path, Path]]:
+    """Point the file output of the passes to a temporary directory next to an image.
+
+    Args:
+        scene: the scene with the passes, see set_render_passes.
+        path_render: the path to the image.
 
-        for id_dev in ids_cuda_devices:
-            for dev in bpy.context.preferences.addons["cycles"].preferences.devices:
-                if cuda_devices[id_dev] == dev["name"]:
-                    dev["use"] = 1
+    Returns:
+        The temporary directory, to remove after the render, and the final path of every file
+        written by the render: <stem>_passes.exr if multilayer, <stem>_<pass>.exr otherwise.
+    """
+    node_output = scene.node_tree.nodes["Passes"]
+    dir_tmp = path_render.parent / f".{path_render.stem}.passes"
+    # The file output appends the frame number to every file.
+    frame = f"{scene.frame_current:04d}"
+
+    paths = {}
+    if node_output.format.file_format == "OPEN_EXR_MULTILAYER":
+        node_output.base_path = str(dir_tmp / "passes")
+        path_passes = path_render.with_name(f"{path_render.stem}_passes.exr")
+        paths[dir_tmp / f"passes{frame}.exr"] = path_passes
     else:
-        for dev in bpy.context.preferences.addons["cycles"].preferences.devices:
-            dev["use"] = 1
+        node_output.base_path = str(dir_tmp)
+        for slot in node_output.file_slots:
+            path_pass = path_render.with_name(f"{path_render.stem}_{slot.path}.exr")
+            paths[dir_tmp / f"{slot.path}{frame}.exr"] = path_pass
 
-    devices_enable = []
-    for dev in bpy.context.preferences.addons["cycles"].preferences.devices:
-        if dev["use"]:
-            devices_enable.append(dev["name"])
+    return dir_tmp, paths
 
-    if use_denoiser:
-        scene.cycles.use_denoising = True
-        scene.cycles.denoiser = "OPTIX"
 
-    print(f"Devices for rendering: {devices_enable}")
+_RENDER_PEAK_MEMORY_MB = [0.0]
+
+
+@bpy.app.handlers.persistent
+def _update_render_peak_memory(stats: str) -> None:
+    for value in re.findall(r"Peak[: ]\s*([0-9.]+)M", stats):
+        _RENDER_PEAK_MEMORY_MB[0] = max(_RENDER_PEAK_MEMORY_MB[0], float(value))
+
+
+def track_render_memory() -> None:
+    """Start tracking the peak memory reported by the renderer, resetting the previous peak."""
+    _RENDER_PEAK_MEMORY_MB[0] = 0.0
+    if _update_render_peak_memory not in bpy.app.handlers.render_stats:
+        bpy.app.handlers.render_stats.append(_update_render_peak_memory)
+
+
+def get_peak_memory() -> Dict[str, float]:
+    """Get the peak memory of the renderer since track_render_memory and of the process.
+
+    Returns:
+        The peak memory in MB, with keys "render" and "process".
+    """
+    # ru_maxrss is in kilobytes on Linux.
+    peak_process = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    return {"render": _RENDER_PEAK_MEMORY_MB[0], "process": peak_process}
+
+
+def set_viewer_node(scene: bpy.types.Scene) -> bpy.types.Node:
+    """Link the image of the render to a compositor viewer, to read it with read_viewer_pixels.
+
+    Args:
+        scene: the scene to render.
+
+    Returns:
+        The viewer node, named "Viewer".
+    """
+    scene.use_nodes = True
+    nodes = scene.node_tree.nodes
+    node_layers = next(node for node in nodes if node.type == "R_LAYERS")
+
+    node_viewer = nodes.get("Viewer") or nodes.new(type="CompositorNodeViewer")
+    node_viewer.name = "Viewer"
+    node_viewer.use_alpha = True
+    scene.node_tree.links.new(node_layers.outputs["Image"], node_viewer.inputs["Image"])
+
+    return node_viewer
+
+
+def is_standard_view(scene: bpy.types.Scene) -> bool:
+    """Check if the scene saves images with the plain sRGB transform applied by utils.writer.
+
+    Args:
+        scene: the scene to render.
+
+    Returns:
+        True for the "Standard" view transform on an sRGB display, without look, exposure,
+        gamma or curves.
+    """
+    view = scene.view_settings
+
+    return (
+        scene.display_settings.display_device == "sRGB"
+        and view.view_transform == "Standard"
+        and view.look == "None"
+        and view.exposure == 0.0
+        and view.gamma == 1.0
+        and not view.use_curve_mapping
+    )
+
+
+def read_viewer_pixels() -> np.ndarray:
+    """Read the pixels of the last render from the compositor viewer, see set_viewer_node.
+
+    Returns:
+        The (H, W, 4) linear premultiplied RGBA pixels, with the first row at the top.
+    """
+    image = bpy.data.images["Viewer Node"]
+    width, height = image.size
+    pixels = np.empty(width * height * 4, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+
+    # Blender stores the rows from the bottom.
+    return pixels.reshape(height, width, 4)[::-1]
+
+
+def read_image(path_image: Path) -> np.ndarray:
+    """Read an image with Blender, e.g. a render, without leaving it in the blend data.
+
+    Args:
+        path_image: the path to the image.
+
+    Returns:
+        The (H, W, 4) float RGBA image in [0, 1], with the first row at the top.
+    """
+    image = bpy.data.images.load(str(path_image))
+    width, height = image.size
+    pixels = np.empty(width * height * 4, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    bpy.data.images.remove(image)
+
+    # Blender stores the rows from the bottom.
+    return pixels.reshape(height, width, 4)[::-1]
 
 
 def add_track_to_constraint(
@@ -128,6 +470,44 @@ def create_camera(location: Tuple[float, float, float]) -> bpy.types.Object:
     return cam
 
 
+def orbit_locations(
+    location: Tuple[float, float, float],
+    num_azimuths: int,
+    elevations: Optional[List[float]] = None,
+) -> List[Tuple[float, float, float]]:
+    """Get camera locations evenly spaced around the origin, e.g. for a turntable.
+
+    Args:
+        location: the first location, it sets the distance from the origin and the first azimuth.
+        num_azimuths: the number of locations for every elevation.
+        elevations: the elevations in degrees, if None only the elevation of location.
+            Defaults to None.
+
+    Returns:
+        The locations, for every elevation all the azimuths.
+    """
+    x, y, z = location
+    distance = math.sqrt(x**2 + y**2 + z**2)
+    azimuth_start = math.atan2(y, x)
+    if elevations is None:
+        elevations = [math.degrees(math.asin(z / distance))]
+
+    locations = []
+    for elevation in elevations:
+        elevation = math.radians(elevation)
+        for i in range(num_azimuths):
+            azimuth = azimuth_start + 2 * math.pi * i / num_azimuths
+            locations.append(
+                (
+                    distance * math.cos(elevation) * math.cos(azimuth),
+                    distance * math.cos(elevation) * math.sin(azimuth),
+                    distance * math.sin(elevation),
+                )
+            )
+
+    return locations
+
+
 def set_camera_params(
     camera: bpy.types.Camera, focus_target_object: bpy.types.Object, lens: float = 85.0
 ) -> None:
@@ -335,11 +715,31 @@ def set_principled_node_as_gold(principled_node: bpy.types.Node) -> None:
     )
 
 
-def load_mesh(path_mesh: Path) -> bpy.types.Object:
+def load_mesh(
+    path_mesh: Path,
+    cache: Optional[GeometryCache] = None,
+    target: Optional[bpy.types.Object] = None,
+    arrays: Optional[Dict[str, np.ndarray]] = None,
+) -> bpy.types.Object:
+
+    # The arrays already read, e.g. in the background, skip the file and the cache.
+    if arrays is None:
+        arrays = cached_arrays(cache, ("mesh", Path(path_mesh)), lambda: read_ply(path_mesh))
+    if arrays.get("faces") is None or arrays.get("face_sizes") is None:
+        raise ValueError(f"{path_mesh} has no faces, render it as a point cloud.")
+
+    def build() -> bpy.types.Mesh:
+        mesh = mesh_from_arrays(Path(path_mesh).stem, **arrays)
+        mesh.validate()
+        return mesh
+
+    topology = ("mesh", arrays["vertices"].shape[0], arrays.get("faces"), arrays.get("face_sizes"))
+    current_object, _ = link_or_update_mesh(
+        "object", topology, arrays["vertices"], arrays.get("colors"), build, target=target
+    )
+    if target is not None:
+        return current_object
 
-    bpy.ops.import_mesh.ply(filepath=str(path_mesh))
-    current_object = bpy.context.object
-    current_object.name = "object"
     mat = create_material("Material_Right", use_nodes=True, make_node_tree_empty=True)
     nodes = mat.node_tree.nodes
     links = mat.node_tree.links
@@ -355,94 +755,682 @@ def load_mesh(path_mesh: Path) -> bpy.types.Object:
     return focus_target
 
 
-def pcd_to_sphere(
-    pcd: np.ndarray, radius, offset=(0.0, 0.0, 0.0), scale: float = 1.0, subdivision: int = 2
+def link_mesh(
+    mesh: bpy.types.Mesh, name: str, target: Optional[bpy.types.Object] = None
 ) -> bpy.types.Object:
+    """Link a mesh to the scene as the object named "object".
+
+    Args:
+        mesh: the mesh to link.
+        name: the name of a new object, before renaming it "object".
+        target: if given, the object whose mesh is replaced instead of creating a new object.
+            Its materials are moved to the new mesh and its old mesh is freed. Defaults to None.
+
+    Returns:
+        The object with the mesh.
+    """
+    if target is None:
+        obj = bpy.data.objects.new(name, mesh)
+        obj.name = "object"
+        bpy.context.collection.objects.link(obj)
+        return obj
 
-    remove_objects()
-    mesh = bmesh.new()
+    old_mesh = target.data
+    for material in old_mesh.materials:
+        mesh.materials.append(material)
 
-    bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=subdivision)
-    sphere_base_mesh = bpy.context.scene.objects["Icosphere"].data
+    target.data = mesh
+    bpy.data.meshes.remove(old_mesh)
+    bpy.context.view_layer.update()
 
-    for face in sphere_base_mesh.polygons:
-        face.use_smooth = True
+    return target
 
-    step = 0
 
-    for p in pcd:
-        location = (p[0] * scale + offset[0], p[1] * scale + offset[1], p[2] * scale + offset[2])
+def update_mesh_vertices(
+    mesh: bpy.types.Mesh, vertices: np.ndarray, colors: Optional[np.ndarray] = None
+) -> None:
+    """Write new vertex coordinates and colors into a mesh, keeping its faces.
 
-        m = sphere_base_mesh.copy()
+    Args:
+        mesh: the mesh to update.
+        vertices: the (V, 3) array with the vertex coordinates, V as in the mesh.
+        colors: the optional (V, 3) or (V, 4) array with per vertex colors for "Col".
+    """
+    mesh.vertices.foreach_set("co", np.asarray(vertices, dtype=np.float32).ravel())
+
+    if colors is not None and "Col" in mesh.attributes:
+        rgba = np.ones((colors.shape[0], 4), dtype=np.float32)
+        rgba[:, : colors.shape[1]] = colors
+        if mesh.attributes["Col"].domain == "POINT":
+            mesh.attributes["Col"].data.foreach_set("color", rgba.ravel())
+        else:
+            loops = np.empty(len(mesh.loops), dtype=np.int32)
+            mesh.loops.foreach_get("vertex_index", loops)
+            mesh.vertex_colors["Col"].data.foreach_set("color", rgba[loops].ravel())
+
+    mesh.update()
+
+
+def link_or_update_mesh(
+    name: str,
+    topology: Tuple[Any, ...],
+    vertices: np.ndarray,
+    colors: Optional[np.ndarray],
+    build: Callable[[], bpy.types.Mesh],
+    target: Optional[bpy.types.Object] = None,
+) -> Tuple[bpy.types.Object, bool]:
+    """Update the vertices of target in place if its topology matches, otherwise link a new mesh.
+
+    Writing only the vertices is much cheaper than building a mesh, e.g. for the steps of an
+    interpolation that share the faces.
 
-        for vertex in m.vertices:
-            vertex.co[0] = vertex.co[0] * radius + location[0]
-            vertex.co[1] = vertex.co[1] * radius + location[1]
-            vertex.co[2] = vertex.co[2] * radius + location[2]
-            step += 1
+    Args:
+        name: the name of a new object, see link_mesh.
+        topology: the tuple identifying the faces and the number of vertices, hashed as in
+            GeometryCache.key and stored in the "topology" property of the object.
+        vertices: the (V, 3) array with the vertex coordinates.
+        colors: the optional (V, 3) or (V, 4) array with per vertex colors.
+        build: the function building the mesh if it cannot be updated.
+        target: the optional object built by a previous call. Defaults to None.
 
-        if pcd.shape[1] > 3:
-            m.vertex_colors.new(name="Col")
-            for vertex_color in m.vertex_colors["Col"].data:
-                vertex_color.color = (p[3], p[4], p[5], 1.0)
+    Returns:
+        The object and True if it was updated in place.
+    """
+    key = GeometryCache.key(*topology)
+    if (
+        target is not None
+        and target.get("topology") == key
+        and len(target.data.vertices) == vertices.shape[0]
+    ):
+        with stage("update_vertices"):
+            update_mesh_vertices(target.data, vertices, colors)
+            bpy.context.view_layer.update()
+        return target, True
 
-        mesh.from_mesh(m)
-        del m
+    with stage("mesh"):
+        obj = link_mesh(build(), name, target=target)
+    obj["topology"] = key
 
-    mesh_spheres = bpy.data.meshes.new("Mesh")
-    mesh.to_mesh(mesh_spheres)
+    return obj, False
 
-    obj = bpy.data.objects.new("BRC_Point_Cloud", mesh_spheres)
-    obj.name = "object"
-    bpy.context.collection.objects.link(obj)
 
-    bpy.ops.object.empty_add(location=(0.0, 0.0, 0.0))
-    focus_target = obj
+def remove_node_modifiers(obj: bpy.types.Object) -> None:
+    """Remove the geometry nodes modifiers of an object and free their node groups.
 
-    bpy.data.objects.remove(bpy.context.scene.objects["Icosphere"])
+    Args:
+        obj: the object.
+    """
+    for modifier in list(obj.modifiers):
+        if modifier.type == "NODES":
+            node_group = modifier.node_group
+            obj.modifiers.remove(modifier)
+            if node_group is not None and node_group.users == 0:
+                bpy.data.node_groups.remove(node_group)
 
-    return focus_target
 
+def cached_arrays(
+    cache: Optional[GeometryCache],
+    key_parts: Tuple[Any, ...],
+    build: Callable[[], Dict[str, np.ndarray]],
+) -> Dict[str, np.ndarray]:
+    """Get the arrays of a geometry from the cache, building and caching them if missing.
 
-def voxels_to_cube(
-    voxels: np.ndarray, radius: float, offset=(0.0, 0.0, 0.0), scale: float = 1.0
-) -> bpy.types.Object:
+    Args:
+        cache: the cache to use, if None the arrays are always built.
+        key_parts: the inputs of the build, see GeometryCache.key.
+        build: the function building the arrays.
+
+    Returns:
+        The arrays by name.
+    """
+    with stage("arrays"):
+        if cache is None:
+            return build()
+
+        key = cache.key(*key_parts)
+        arrays = cache.load(key)
+        if arrays is None:
+            arrays = build()
+            cache.save(key, arrays)
+
+    return arrays
+
+
+def mesh_from_arrays(
+    name: str,
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    colors: Optional[np.ndarray] = None,
+    use_smooth: bool = False,
+    face_sizes: Optional[np.ndarray] = None,
+) -> bpy.types.Mesh:
+    """Create a mesh datablock from vertex and face arrays in one bulk pass.
 
-    points = np.where(voxels)
-    locations = np.zeros((points[0].shape[0], 3), dtype=float)
-    locations[:, 0] = (points[0][:] + 0.5) / voxels.shape[0]
-    locations[:, 1] = (points[1][:] + 0.5) / voxels.shape[1]
-    locations[:, 2] = (points[2][:] + 0.5) / voxels.shape[2]
-    locations[:, 0] -= 0.5
-    locations[:, 1] -= 0.5
-    locations[:, 2] -= 0.5
+    Args:
+        name: the name of the new mesh.
+        vertices: the (V, 3) array with the vertex coordinates.
+        faces: the (F, K) array with the vertex indices of each face, all faces have K corners,
+            or the flat array with the vertex indices of all faces if face_sizes is given.
+        colors: the optional (V, 3) or (V, 4) array with per vertex colors, stored in "Col".
+        use_smooth: if True the faces are shaded smooth. Defaults to False.
+        face_sizes: the optional (F,) array with the number of corners of each face.
+
+    Returns:
+        The new mesh.
+    """
+    loops = np.asarray(faces, dtype=np.int32).ravel()
+    if face_sizes is None:
+        num_faces, num_corners = faces.shape
+        face_sizes = np.full(num_faces, num_corners, dtype=np.int32)
+    face_sizes = np.asarray(face_sizes, dtype=np.int32)
+    num_faces = face_sizes.shape[0]
 
-    locations[:, 0] = locations[:, 0] * scale + offset[0]
-    locations[:, 1] = locations[:, 1] * scale + offset[1]
-    locations[:, 2] = locations[:, 2] * scale + offset[2]
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(vertices.shape[0])
+    mesh.vertices.foreach_set("co", np.asarray(vertices, dtype=np.float32).ravel())
 
-    mesh = bmesh.new()
+    mesh.loops.add(loops.shape[0])
+    mesh.loops.foreach_set("vertex_index", loops)
 
-    bpy.ops.mesh.primitive_cube_add()
-    cube_base_mesh = bpy.context.scene.objects["Cube"].data
+    mesh.polygons.add(num_faces)
+    loop_start = (np.cumsum(face_sizes) - face_sizes).astype(np.int32)
+    mesh.polygons.foreach_set("loop_start", loop_start)
+    mesh.polygons.foreach_set("loop_total", face_sizes)
+    mesh.polygons.foreach_set("use_smooth", np.full(num_faces, use_smooth, dtype=bool))
 
-    for i in range(locations.shape[0]):
-        m = cube_base_mesh.copy()
-        for vertex in m.vertices:
-            vertex.co[0] = vertex.co[0] * radius + locations[i, 0]
-            vertex.co[1] = vertex.co[1] * radius + locations[i, 1]
-            vertex.co[2] = vertex.co[2] * radius + locations[i, 2]
+    if colors is not None:
+        rgba = np.ones((colors.shape[0], 4), dtype=np.float32)
+        rgba[:, : colors.shape[1]] = colors
+        mesh.vertex_colors.new(name="Col")
+        mesh.vertex_colors["Col"].data.foreach_set("color", rgba[loops].ravel())
 
-        mesh.from_mesh(m)
+    mesh.update(calc_edges=True)
+
+    return mesh
+
+
+def mesh_to_arrays(mesh: bpy.types.Mesh) -> Tuple[np.ndarray, np.ndarray]:
+    """Read the vertex and face arrays of a mesh whose faces have all the same number of corners.
+
+    Args:
+        mesh: the mesh to read.
+
+    Returns:
+        The (V, 3) array with the vertex coordinates and the (F, K) array with the faces.
+    """
+    vertices = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", vertices)
 
-    bpy.data.objects.remove(bpy.context.scene.objects["Cube"])
+    loops = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loops)
 
-    mesh_cubes = bpy.data.meshes.new("Mesh")
-    mesh.to_mesh(mesh_cubes)
+    return vertices.reshape(-1, 3), loops.reshape(len(mesh.polygons), -1)
 
-    obj = bpy.data.objects.new("BRC_Occupancy", mesh_cubes)
-    obj.name = "object"
 
-    bpy.context.collection.objects.link(obj)
+def pop_primitive_arrays(name: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Read the arrays of a primitive just added to the scene and remove it.
+
+    Args:
+        name: the name of the primitive object, e.g. "Icosphere" or "Cube".
+
+    Returns:
+        The (V, 3) array with the vertex coordinates and the (F, K) array with the faces.
+    """
+    primitive_object = bpy.context.scene.objects[name]
+    primitive_mesh = primitive_object.data
+    vertices, faces = mesh_to_arrays(primitive_mesh)
+
+    bpy.data.objects.remove(primitive_object)
+    bpy.data.meshes.remove(primitive_mesh)
+
+    return vertices, faces
+
+
+def tile_arrays(
+    base_vertices: np.ndarray, base_faces: np.ndarray, locations: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Replicate a base mesh at every location.
+
+    Args:
+        base_vertices: the (V, 3) array with the vertices of the base mesh.
+        base_faces: the (F, K) array with the faces of the base mesh.
+        locations: the (N, 3) array with the translation of every copy.
+
+    Returns:
+        The (N * V, 3) array with the vertices and the (N * F, K) array with the faces.
+    """
+    # (N, 1, 3) + (1, V, 3) -> (N * V, 3)
+    vertices = (locations[:, None, :] + base_vertices[None, :, :]).reshape(-1, 3)
+
+    shift = np.arange(locations.shape[0], dtype=np.int64)[:, None, None] * base_vertices.shape[0]
+    faces = (base_faces[None, :, :] + shift).reshape(-1, base_faces.shape[1])
+
+    return vertices, faces
+
+
+def points_mesh(
+    pcd: np.ndarray, offset=(0.0, 0.0, 0.0), scale: float = 1.0, name: str = "Mesh"
+) -> bpy.types.Mesh:
+    """Create a mesh with one loose vertex per point.
+
+    Args:
+        pcd: the (N, 3) array with the points or the (N, 6) array with points and rgb colors.
+        offset: the translation applied to the points. Defaults to (0.0, 0.0, 0.0).
+        scale: the scale applied to the points. Defaults to 1.0.
+        name: the name of the new mesh. Defaults to "Mesh".
+
+    Returns:
+        The new mesh, with colors stored in the point attribute "Col".
+    """
+    locations = pcd[:, :3] * scale + np.asarray(offset)
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(locations.shape[0])
+    mesh.vertices.foreach_set("co", locations.astype(np.float32).ravel())
+
+    if pcd.shape[1] > 3:
+        rgba = np.ones((pcd.shape[0], 4), dtype=np.float32)
+        rgba[:, :3] = pcd[:, 3:6]
+        attribute = mesh.attributes.new(name="Col", type="FLOAT_COLOR", domain="POINT")
+        attribute.data.foreach_set("color", rgba.ravel())
+
+    mesh.update()
+
+    return mesh
+
+
+def new_geometry_node_group(name: str) -> bpy.types.NodeTree:
+    """Create a geometry node group with one geometry input and one geometry output.
+
+    Args:
+        name: the name of the node group.
+
+    Returns:
+        The new node group, with the nodes "Group Input" and "Group Output".
+    """
+    node_group = bpy.data.node_groups.new(name, "GeometryNodeTree")
+
+    if hasattr(node_group, "interface"):
+        node_group.interface.new_socket(
+            "Geometry", in_out="INPUT", socket_type="NodeSocketGeometry"
+        )
+        node_group.interface.new_socket(
+            "Geometry", in_out="OUTPUT", socket_type="NodeSocketGeometry"
+        )
+    else:
+        node_group.inputs.new("NodeSocketGeometry", "Geometry")
+        node_group.outputs.new("NodeSocketGeometry", "Geometry")
+
+    node_input = node_group.nodes.new("NodeGroupInput")
+    node_input.name = "Group Input"
+    node_output = node_group.nodes.new("NodeGroupOutput")
+    node_output.name = "Group Output"
+
+    return node_group
+
+
+def add_sphere_instancing(obj: bpy.types.Object, radius: float, subdivision: int) -> None:
+    """Instance one icosphere on every vertex of an object with geometry nodes.
+
+    The point attributes of the object, e.g. "Col", are propagated to the instances
+    and can be read in the shaders with an attribute node of type "INSTANCER".
+
+    Args:
+        obj: the object with the points.
+        radius: the radius of the spheres.
+        subdivision: the subdivisions of the icosphere.
+    """
+    node_group = new_geometry_node_group("Sphere_Instancing")
+    nodes = node_group.nodes
+    links = node_group.links
+
+    node_sphere = nodes.new("GeometryNodeMeshIcoSphere")
+    node_sphere.inputs["Radius"].default_value = radius
+    node_sphere.inputs["Subdivisions"].default_value = subdivision
+
+    node_smooth = nodes.new("GeometryNodeSetShadeSmooth")
+    node_instance = nodes.new("GeometryNodeInstanceOnPoints")
+
+    links.new(node_sphere.outputs["Mesh"], node_smooth.inputs["Geometry"])
+    links.new(nodes["Group Input"].outputs[0], node_instance.inputs["Points"])
+    links.new(node_smooth.outputs["Geometry"], node_instance.inputs["Instance"])
+    links.new(node_instance.outputs["Instances"], nodes["Group Output"].inputs[0])
+
+    modifier = obj.modifiers.new("Sphere_Instancing", "NODES")
+    modifier.node_group = node_group
+
+
+def add_point_primitives(obj: bpy.types.Object, radius: float) -> None:
+    """Convert the vertices of an object to points, rendered by Cycles as analytic spheres.
+
+    The point attributes of the object, e.g. "Col", are kept on the points.
+
+    Args:
+        obj: the object with the points.
+        radius: the radius of the spheres.
+    """
+    node_group = new_geometry_node_group("Point_Primitives")
+    nodes = node_group.nodes
+    links = node_group.links
+
+    node_points = nodes.new("GeometryNodeMeshToPoints")
+    node_points.inputs["Radius"].default_value = radius
+
+    links.new(nodes["Group Input"].outputs[0], node_points.inputs["Mesh"])
+    links.new(node_points.outputs["Points"], nodes["Group Output"].inputs[0])
+
+    modifier = obj.modifiers.new("Point_Primitives", "NODES")
+    modifier.node_group = node_group
+
+
+def color_attribute_type(obj: bpy.types.Object) -> str:
+    """Get the type of attribute node to read the "Col" colors of an object built by pcd_to_sphere.
+
+    Args:
+        obj: the object returned by pcd_to_sphere.
+
+    Returns:
+        "INSTANCER" for instanced spheres, "GEOMETRY" otherwise.
+    """
+    return "INSTANCER" if obj.get("pcd_mode") == "instance" else "GEOMETRY"
+
+
+def geometry_counts(obj: bpy.types.Object) -> Dict[str, int]:
+    """Count the vertices and triangles rendered for an object built by this module.
+
+    Instanced spheres count one icosphere for every point, analytic spheres have no triangles.
+
+    Args:
+        obj: the object.
+
+    Returns:
+        The number of "vertices" and "triangles".
+    """
+    mesh = obj.data
+    loop_totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loop_totals)
+    num_vertices = len(mesh.vertices)
+    num_triangles = int(np.sum(loop_totals - 2))
+
+    if obj.get("pcd_mode") == "instance":
+        # An icosphere has 20 * 4^(s - 1) triangles and half as many vertices plus 2.
+        triangles_sphere = 20 * 4 ** (obj["subdivision"] - 1)
+        num_triangles = num_vertices * triangles_sphere
+        num_vertices *= triangles_sphere // 2 + 2
+
+    return {"vertices": num_vertices, "triangles": num_triangles}
+
+
+def pcd_to_sphere(
+    pcd: np.ndarray,
+    radius,
+    offset=(0.0, 0.0, 0.0),
+    scale: float = 1.0,
+    subdivision: int = 2,
+    mode: str = "mesh",
+    cache: Optional[GeometryCache] = None,
+    target: Optional[bpy.types.Object] = None,
+) -> bpy.types.Object:
+    """Create one object with a sphere for every point of a point cloud.
+
+    Args:
+        pcd: the (N, 3) array with the points or the (N, 6) array with points and rgb colors.
+        radius: the radius of the spheres.
+        offset: the translation applied to the points. Defaults to (0.0, 0.0, 0.0).
+        scale: the scale applied to the points. Defaults to 1.0.
+        subdivision: the subdivisions of the icosphere. Defaults to 2.
+        mode: "mesh" bakes a copy of the icosphere for every point in one mesh, "instance" keeps
+            one icosphere instanced on the points with geometry nodes and "points" renders the
+            points as analytic spheres, ignoring subdivision. "instance" and "points" need
+            Blender 3.1 or newer, otherwise "mesh" is used. Defaults to "mesh".
+        cache: the optional cache for the arrays of the spheres in "mesh" mode. Defaults to None.
+        target: the optional object built by a previous call whose mesh is replaced, keeping the
+            rest of the scene. Defaults to None.
+
+    Raises:
+        ValueError: if the mode is unknown.
+
+    Returns:
+        The created object, the mode actually used is stored in its "pcd_mode" property.
+    """
+    if mode not in ("mesh", "instance", "points"):
+        raise ValueError(f"Unknown point cloud mode {mode}.")
+
+    if mode != "mesh" and bpy.app.version < (3, 1, 0):
+        print(f"Mode {mode} needs Blender 3.1, found {bpy.app.version_string}: using mesh mode.")
+        mode = "mesh"
+
+    if target is None:
+        remove_objects()
+
+    if mode == "mesh":
+
+        def build() -> Dict[str, np.ndarray]:
+            bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=subdivision)
+            sphere_vertices, sphere_faces = pop_primitive_arrays("Icosphere")
+
+            locations = pcd[:, :3] * scale + np.asarray(offset)
+            vertices, faces = tile_arrays(sphere_vertices * radius, sphere_faces, locations)
+            arrays = {"vertices": vertices, "faces": faces}
+
+            if pcd.shape[1] > 3:
+                arrays["colors"] = np.repeat(pcd[:, 3:6], sphere_vertices.shape[0], axis=0)
+
+            return arrays
+
+        key_parts = ("pcd", pcd, radius, tuple(offset), scale, subdivision)
+        arrays = cached_arrays(cache, key_parts, build)
+        vertices, colors = arrays["vertices"], arrays.get("colors")
+        topology = ("spheres", pcd.shape[0], subdivision, colors is not None)
+        obj, updated = link_or_update_mesh(
+            "BRC_Point_Cloud",
+            topology,
+            vertices,
+            colors,
+            lambda: mesh_from_arrays("Mesh", **arrays, use_smooth=True),
+            target=target,
+        )
+    else:
+        vertices = pcd[:, :3] * scale + np.asarray(offset)
+        colors = pcd[:, 3:6] if pcd.shape[1] > 3 else None
+        # The modifiers depend on the radius and subdivision, updated in place with the points.
+        topology = ("points", pcd.shape[0], mode, radius, subdivision, colors is not None)
+        obj, updated = link_or_update_mesh(
+            "BRC_Point_Cloud",
+            topology,
+            vertices,
+            colors,
+            lambda: points_mesh(pcd, offset=offset, scale=scale),
+            target=target,
+        )
+    obj["pcd_mode"] = mode
+    obj["subdivision"] = subdivision
+
+    if not updated:
+        with stage("modifiers"):
+            remove_node_modifiers(obj)
+            if mode == "instance":
+                add_sphere_instancing(obj, radius=radius, subdivision=subdivision)
+            elif mode == "points":
+                add_point_primitives(obj, radius=radius)
+
+    if target is None:
+        bpy.ops.object.empty_add(location=(0.0, 0.0, 0.0))
     focus_target = obj
+
+    return focus_target
+
+
+def voxel_centers(
+    voxels: np.ndarray, offset=(0.0, 0.0, 0.0), scale: float = 1.0
+) -> np.ndarray:
+    """Compute the centers of the occupied cells of a voxel grid.
+
+    Args:
+        voxels: the occupancy grid.
+        offset: the translation applied to the centers. Defaults to (0.0, 0.0, 0.0).
+        scale: the scale applied to the grid, which spans [-0.5, 0.5]. Defaults to 1.0.
+
+    Returns:
+        The (N, 3) array with the centers of the occupied cells.
+    """
+    points = np.stack(np.where(voxels), axis=1)
+    locations = (points + 0.5) / np.asarray(voxels.shape) - 0.5
+
+    return locations * scale + np.asarray(offset)
+
+
+def greedy_rectangles(mask: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """Cover the true cells of a 2D mask with as few rectangles as possible, greedily.
+
+    Args:
+        mask: the 2D boolean mask to cover.
+
+    Returns:
+        The list of rectangles as (row, col, height, width).
+    """
+    mask = mask.copy()
+    num_rows, num_cols = mask.shape
+    rectangles = []
+
+    for i, j in zip(*np.nonzero(mask)):
+        if not mask[i, j]:
+            continue
+
+        width = 1
+        while j + width < num_cols and mask[i, j + width]:
+            width += 1
+
+        height = 1
+        while i + height < num_rows and mask[i + height, j : j + width].all():
+            height += 1
+
+        mask[i : i + height, j : j + width] = False
+        rectangles.append((i, j, height, width))
+
+    return rectangles
+
+
+def voxel_surface_arrays(voxels: np.ndarray, greedy: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """Extract the exposed faces of a voxel grid, in grid units.
+
+    A face is exposed when the neighbouring cell along its normal is empty or outside the grid.
+
+    Args:
+        voxels: the occupancy grid.
+        greedy: if True merge coplanar exposed faces into larger quads. Defaults to False.
+
+    Returns:
+        The (4 * F, 3) array with the vertices in [0, voxels.shape] and the (F, 4) quads.
+    """
+    occupancy = np.pad(voxels.astype(bool), 1)
+    corners = []
+
+    for axis in range(3):
+        # (axis, u, v) is a cyclic permutation of (x, y, z), so u x v points along +axis.
+        u, v = (axis + 1) % 3, (axis + 2) % 3
+
+        for direction in (1, -1):
+            neighbour = np.roll(occupancy, -direction, axis=axis)
+            exposed = (occupancy & ~neighbour)[1:-1, 1:-1, 1:-1].transpose(axis, u, v)
+
+            if greedy:
+                rectangles = [
+                    (k, i, j, h, w)
+                    for k in range(exposed.shape[0])
+                    for i, j, h, w in greedy_rectangles(exposed[k])
+                ]
+                rectangles = np.asarray(rectangles, dtype=np.int64).reshape(-1, 5)
+                k, i, j, h, w = rectangles.T
+            else:
+                k, i, j = np.nonzero(exposed)
+                h = w = np.ones_like(k)
+
+            plane = k + (1 if direction > 0 else 0)
+            quad = np.zeros((k.shape[0], 4, 3), dtype=np.int64)
+            quad[:, :, axis] = plane[:, None]
+            quad[:, :, u] = np.stack((i, i + h, i + h, i), axis=1)
+            quad[:, :, v] = np.stack((j, j, j + w, j + w), axis=1)
+
+            # Counter-clockwise when seen from the side the face points to.
+            corners.append(quad if direction > 0 else quad[:, ::-1])
+
+    quads = np.concatenate(corners, axis=0)
+    vertices = quads.reshape(-1, 3).astype(float)
+    faces = np.arange(vertices.shape[0], dtype=np.int64).reshape(-1, 4)
+
+    return vertices, faces
+
+
+def voxels_to_cube(
+    voxels: np.ndarray,
+    radius: Optional[float] = None,
+    offset=(0.0, 0.0, 0.0),
+    scale: float = 1.0,
+    mode: str = "cubes",
+    cache: Optional[GeometryCache] = None,
+    target: Optional[bpy.types.Object] = None,
+) -> bpy.types.Object:
+    """Create one object with a cube for every occupied cell of a voxel grid.
+
+    Args:
+        voxels: the occupancy grid.
+        radius: half the side of each cube, None fills the cells. Defaults to None.
+        offset: the translation applied to the grid. Defaults to (0.0, 0.0, 0.0).
+        scale: the scale applied to the grid, which spans [-0.5, 0.5]. Defaults to 1.0.
+        mode: "cubes" emits all the faces of every cube, "surface" only the exposed ones and
+            "greedy" merges the exposed coplanar faces into larger quads. Defaults to "cubes".
+        cache: the optional cache for the arrays of the cubes. Defaults to None.
+        target: the optional object built by a previous call whose mesh is replaced, keeping the
+            rest of the scene. Defaults to None.
+
+    Raises:
+        ValueError: if the mode is unknown.
+        ValueError: if mode is "surface" or "greedy" and the cubes do not fill their cells.
+
+    Returns:
+        The created object.
+    """
+    if mode not in ("cubes", "surface", "greedy"):
+        raise ValueError(f"Unknown voxel mode {mode}.")
+
+    size_cells = scale / np.asarray(voxels.shape)
+    if mode != "cubes" and radius is not None:
+        # Faces between two neighbours are visible through the gaps of cubes smaller than the cells.
+        if not np.allclose(2 * radius, size_cells):
+            raise ValueError(
+                f"Mode {mode} needs cubes that fill their cells: radius should be {size_cells / 2}."
+            )
+
+    def build() -> Dict[str, np.ndarray]:
+        if mode == "cubes":
+            locations = voxel_centers(voxels, offset=offset, scale=scale)
+
+            bpy.ops.mesh.primitive_cube_add()
+            cube_vertices, cube_faces = pop_primitive_arrays("Cube")
+
+            half_sides = size_cells / 2 if radius is None else radius
+            vertices, faces = tile_arrays(cube_vertices * half_sides, cube_faces, locations)
+        else:
+            vertices, faces = voxel_surface_arrays(voxels, greedy=mode == "greedy")
+            vertices = (vertices / np.asarray(voxels.shape) - 0.5) * scale + np.asarray(offset)
+
+        return {"vertices": vertices, "faces": faces}
+
+    key_parts = ("voxels", voxels, radius, tuple(offset), scale, mode)
+    arrays = cached_arrays(cache, key_parts, build)
+
+    # Tiled cubes share the faces for the same number of voxels, the surfaces need their faces.
+    if mode == "cubes":
+        topology = ("cubes", arrays["vertices"].shape[0])
+    else:
+        topology = ("surface", arrays["faces"])
+    focus_target, _ = link_or_update_mesh(
+        "BRC_Occupancy",
+        topology,
+        arrays["vertices"],
+        None,
+        lambda: mesh_from_arrays("Mesh", **arrays),
+        target=target,
+    )
     return focus_target
@@ -0,0 +1,324 @@
+"""
+Module containing the encoding of the rendered images off the critical path of the render.
+
+The pixels of a render are encoded in the format of the suffix of the output: PNG with 8 or 16
+bits per channel and a chosen compression level, WebP (needs Pillow) or OpenEXR with half or
+float channels. Blender holds the GIL while it renders, so the images are encoded by a pool of
+forked processes where available, of threads otherwise.
+"""
+import multiprocessing
+import os
+import struct
+import time
+import zlib
+from io import BytesIO
+from multiprocessing.pool import AsyncResult, ThreadPool
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.journal import EXR_MAGIC, PNG_SIGNATURE, temporary_path
+
+# Compression of OpenEXR and the number of scanlines compressed together.
+EXR_COMPRESSIONS = {"NONE": (0, 1), "ZIPS": (2, 1), "ZIP": (3, 16)}
+
+
+def to_display(pixels: np.ndarray) -> np.ndarray:
+    """Convert linear premultiplied RGBA pixels to sRGB with straight alpha, as Blender saves them.
+
+    This is the "Standard" view transform, see is_standard_view in utils.utils.
+
+    Args:
+        pixels: the (H, W, 4) linear RGBA pixels.
+
+    Returns:
+        The (H, W, 4) display RGBA pixels in [0, 1].
+    """
+    alpha = pixels[..., 3:4]
+    rgb = np.divide(pixels[..., :3], alpha, out=np.zeros_like(pixels[..., :3]), where=alpha > 0)
+    rgb = np.clip(rgb, 0.0, 1.0)
+    rgb = np.where(rgb <= 0.0031308, 12.92 * rgb, 1.055 * rgb ** (1.0 / 2.4) - 0.055)
+
+    return np.concatenate((rgb, np.clip(alpha, 0.0, 1.0)), axis=-1)
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    crc = zlib.crc32(kind + data) & 0xFFFFFFFF
+
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", crc)
+
+
+def encode_png(pixels: np.ndarray, bit_depth: int = 8, compression: int = 6) -> bytes:
+    """Encode display RGBA pixels as PNG.
+
+    Every row uses the "Up" filter, cheap to compute and effective on renders.
+
+    Args:
+        pixels: the (H, W, 4) display RGBA pixels in [0, 1], with the first row at the top.
+        bit_depth: 8 or 16 bits per channel. Defaults to 8.
+        compression: the zlib level, from 0 (fastest) to 9 (smallest). Defaults to 6.
+
+    Raises:
+        ValueError: if the bit depth is not 8 or 16.
+
+    Returns:
+        The PNG file.
+    """
+    if bit_depth not in (8, 16):
+        raise ValueError(f"PNG images have 8 or 16 bits per channel, got {bit_depth}.")
+
+    height, width, _ = pixels.shape
+    dtype = np.uint8 if bit_depth == 8 else np.dtype(">u2")
+    values = np.round(pixels * (2**bit_depth - 1)).astype(dtype)
+    rows = values.reshape(height, -1).view(np.uint8)
+
+    # The "Up" filter stores the difference with the row above, modulo 256.
+    filtered = np.empty((height, rows.shape[1] + 1), dtype=np.uint8)
+    filtered[:, 0] = 2
+    filtered[0, 1:] = rows[0]
+    filtered[1:, 1:] = rows[1:] - rows[:-1]
+
+    header = struct.pack(">IIBBBBB", width, height, bit_depth, 6, 0, 0, 0)
+
+    return (
+        PNG_SIGNATURE
+        + _png_chunk(b"IHDR", header)
+        + _png_chunk(b"IDAT", zlib.compress(filtered.tobytes(), compression))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def _exr_attribute(name: str, kind: str, value: bytes) -> bytes:
+    return name.encode() + b"\0" + kind.encode() + b"\0" + struct.pack("<i", len(value)) + value
+
+
+def _exr_zip(raw: bytes, compression: int) -> bytes:
+    # Split the even and odd bytes, then store the difference of every byte with the previous.
+    data = np.frombuffer(raw, dtype=np.uint8)
+    interleaved = np.concatenate((data[0::2], data[1::2]))
+    predicted = interleaved.copy()
+    predicted[1:] = interleaved[1:] - interleaved[:-1] + 128
+
+    return zlib.compress(predicted.tobytes(), compression)
+
+
+def encode_exr(
+    pixels: np.ndarray, half: bool = True, exr_codec: str = "ZIP", compression: int = 6
+) -> bytes:
+    """Encode linear RGBA pixels as a scanline OpenEXR.
+
+    Args:
+        pixels: the (H, W, 4) linear premultiplied RGBA pixels, with the first row at the top.
+        half: if True store half floats, otherwise floats. Defaults to True.
+        exr_codec: "NONE", "ZIPS" or "ZIP". Defaults to "ZIP".
+        compression: the zlib level of the ZIP codecs. Defaults to 6.
+
+    Raises:
+        ValueError: if the codec is unknown.
+
+    Returns:
+        The OpenEXR file.
+    """
+    if exr_codec not in EXR_COMPRESSIONS:
+        raise ValueError(f"Unknown OpenEXR codec {exr_codec}, use {list(EXR_COMPRESSIONS)}.")
+
+    height, width, _ = pixels.shape
+    codec, lines_per_block = EXR_COMPRESSIONS[exr_codec]
+    pixel_type = 1 if half else 2
+    # The channels are stored in alphabetical order, every line channel after channel.
+    planes = pixels[..., [3, 2, 1, 0]].astype("<f2" if half else "<f4").transpose(0, 2, 1)
+
+    channels = b"".join(
+        name.encode() + b"\0" + struct.pack("<iB3xii", pixel_type, 0, 1, 1) for name in "ABGR"
+    )
+    window = struct.pack("<iiii", 0, 0, width - 1, height - 1)
+    header = EXR_MAGIC + struct.pack("<i", 2)
+    header += _exr_attribute("channels", "chlist", channels + b"\0")
+    header += _exr_attribute("compression", "compression", struct.pack("<B", codec))
+    header += _exr_attribute("dataWindow", "box2i", window)
+    header += _exr_attribute("displayWindow", "box2i", window)
+    header += _exr_attribute("lineOrder", "lineOrder", struct.pack("<B", 0))
+    header += _exr_attribute("pixelAspectRatio", "float", struct.pack("<f", 1.0))
+    header += _exr_attribute("screenWindowCenter", "v2f", struct.pack("<ff", 0.0, 0.0))
+    header += _exr_attribute("screenWindowWidth", "float", struct.pack("<f", 1.0))
+    header += b"\0"
+
+    chunks = []
+    for y in range(0, height, lines_per_block):
+        raw = planes[y : y + lines_per_block].tobytes()
+        if codec != 0:
+            packed = _exr_zip(raw, compression)
+            # Blocks that do not shrink are stored uncompressed.
+            raw = packed if len(packed) < len(raw) else raw
+        chunks.append(struct.pack("<ii", y, len(raw)) + raw)
+
+    offsets = []
+    offset = len(header) + 8 * len(chunks)
+    for chunk in chunks:
+        offsets.append(offset)
+        offset += len(chunk)
+
+    return header + struct.pack(f"<{len(offsets)}Q", *offsets) + b"".join(chunks)
+
+
+def encode_webp(pixels: np.ndarray, quality: int = 90, lossless: bool = False) -> bytes:
+    """Encode display RGBA pixels as WebP with Pillow.
+
+    Args:
+        pixels: the (H, W, 4) display RGBA pixels in [0, 1], with the first row at the top.
+        quality: the quality from 0 to 100, or the effort if lossless. Defaults to 90.
+        lossless: if True encode without losses. Defaults to False.
+
+    Raises:
+        ValueError: if Pillow is not installed.
+
+    Returns:
+        The WebP file.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ValueError("WebP images need Pillow: pip install pillow")
+
+    image = Image.fromarray(np.round(pixels * 255).astype(np.uint8), "RGBA")
+    buffer = BytesIO()
+    image.save(buffer, format="WEBP", quality=quality, lossless=lossless)
+
+    return buffer.getvalue()
+
+
+def encode_image(
+    pixels: np.ndarray,
+    suffix: str,
+    compression: int = 6,
+    color_depth: str = "8",
+    quality: int = 90,
+    exr_codec: str = "ZIP",
+) -> bytes:
+    """Encode linear premultiplied RGBA pixels in the format of a file suffix.
+
+    Args:
+        pixels: the (H, W, 4) linear premultiplied RGBA pixels, with the first row at the top.
+        suffix: ".png", ".webp" or ".exr".
+        compression: the zlib level of PNG and OpenEXR. Defaults to 6.
+        color_depth: "8" or "16" bits for PNG, "16" (half) or "32" (float) for OpenEXR.
+            Defaults to "8".
+        quality: the quality of WebP, 100 encodes without losses. Defaults to 90.
+        exr_codec: the codec of OpenEXR, see encode_exr. Defaults to "ZIP".
+
+    Raises:
+        ValueError: if the suffix is not supported.
+
+    Returns:
+        The file.
+    """
+    suffix = suffix.lower()
+    if suffix == ".png":
+        return encode_png(to_display(pixels), bit_depth=int(color_depth), compression=compression)
+    if suffix == ".webp":
+        return encode_webp(to_display(pixels), quality=quality, lossless=quality >= 100)
+    if suffix == ".exr":
+        half = str(color_depth) != "32"
+        return encode_exr(pixels, half=half, exr_codec=exr_codec, compression=compression)
+
+    raise ValueError(f"Unsupported image format {suffix}, use .png, .webp or .exr.")
+
+
+def write_image(pixels: np.ndarray, path: Path, **options: Any) -> Dict[str, Any]:
+    """Encode pixels and write them to a temporary file renamed at the end.
+
+    Args:
+        pixels: the (H, W, 4) linear premultiplied RGBA pixels, with the first row at the top.
+        path: the path to the image, its suffix sets the format.
+        options: the options of encode_image.
+
+    Returns:
+        The "path", the "encode_time" in seconds and the size in "bytes" of the image.
+    """
+    path = Path(path)
+    time_start = time.perf_counter()
+    content = encode_image(pixels, path.suffix, **options)
+    encode_time = time.perf_counter() - time_start
+
+    path_tmp = temporary_path(path)
+    try:
+        with open(path_tmp, "wb") as f:
+            f.write(content)
+        os.replace(path_tmp, path)
+    finally:
+        path_tmp.unlink(missing_ok=True)
+
+    return {"path": str(path), "encode_time": encode_time, "bytes": len(content)}
+
+
+class ImageWriter:
+    """Pool encoding and writing images in the background."""
+
+    def __init__(
+        self, num_workers: int = 2, use_process: Optional[bool] = None, **options: Any
+    ) -> None:
+        """Start the pool.
+
+        Args:
+            num_workers: the number of workers. Defaults to 2.
+            use_process: if True encode in forked processes, if False in threads, if None in
+                processes where fork is available. Defaults to None.
+            options: the options of encode_image.
+        """
+        if use_process is None:
+            use_process = "fork" in multiprocessing.get_all_start_methods()
+        # The processes are forked now, before Blender starts the threads of the renders.
+        if use_process:
+            self.pool = multiprocessing.get_context("fork").Pool(num_workers)
+        else:
+            self.pool = ThreadPool(num_workers)
+
+        self.options = options
+        self.submitted: List[AsyncResult] = []
+
+    def submit(self, pixels: np.ndarray, path: Path) -> AsyncResult:
+        """Encode and write an image in the background.
+
+        Args:
+            pixels: the (H, W, 4) linear premultiplied RGBA pixels, first row at the top.
+            path: the path to the image, see write_image.
+
+        Returns:
+            The pending result of write_image.
+        """
+        handle = self.pool.apply_async(write_image, (pixels, path), self.options)
+        self.submitted.append(handle)
+
+        return handle
+
+    def take(self) -> List[AsyncResult]:
+        """Get the images submitted since the last call, e.g. the views of one job."""
+        submitted, self.submitted = self.submitted, []
+
+        return submitted
+
+    def close(self) -> None:
+        """Wait for the pending images and stop the pool."""
+        self.pool.close()
+        self.pool.join()
+
+
+def wait_images(handles: List[AsyncResult]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Wait for images submitted to an ImageWriter.
+
+    Args:
+        handles: the pending results of ImageWriter.submit.
+
+    Returns:
+        The results of write_image of the written images and the first error, None if all the
+        images were written.
+    """
+    written, error = [], None
+    for handle in handles:
+        try:
+            written.append(handle.get())
+        except Exception as e:
+            error = error or repr(e)
+
+    return written, error